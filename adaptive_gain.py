@@ -0,0 +1,186 @@
+import numpy as np
+
+'''
+Windowed energy and adaptive gain of the AUG_* notebooks, on arrays already in memory.
+calculate_energy / calculate_energy_per_window used to reload the wav with librosa.load and
+walk the signal in a Python loop, squaring every sample once per window that covers it
+(8 times for 1 s windows every 125 ms). Here all the window energies come from one cumulative
+sum of the squared samples (taken hop by hop when the window is a whole number of hops), and
+the gains Q of the windows are spread over the samples in one pass, so both are O(n) whatever
+the overlap.
+StreamingEnergy / StreamingAdaptiveGain do the same block by block, as the audio arrives:
+the gain of a window is known as soon as its last sample is in, and a sample is output once
+no later window can cover it.
+
+Offline, as in automate_multifiles:
+  final = adaptive_mix(combined, mixed, alpha=0.1)
+Live:
+  gain = StreamingAdaptiveGain(alpha=0.1)
+  for combined_block, mixed_block in blocks:
+      Q, out = gain.process(combined_block, mixed_block)
+  out = gain.flush()
+'''
+
+window_length = 16000  # 1 second at 16 kHz
+hop_length = 2000  # 1/8 second
+window_scale = 0.125  # hop_length / window_length: each sample is covered by 8 windows
+
+
+def calculate_energy(y):
+    """Returns the energy (sum of squares) of y and its energy per sample"""
+    energy = np.dot(y, y)
+    return energy, energy / len(y)
+
+
+def window_energies(y, window_size=window_length, hop=hop_length):
+    """Energies of the windows of window_size samples of y starting every hop samples,
+    the last window ends at or before the end of y"""
+    if len(y) < window_size:
+        return np.zeros(0)
+    if window_size % hop == 0:
+        # windows made of whole hops: sum the squares of each hop once, then add up hops_per_window of them
+        hops_per_window = window_size // hop
+        blocks = np.asarray(y[:len(y) // hop * hop], dtype=np.float64).reshape(-1, hop)
+        cumulative = np.concatenate([[0.0], np.cumsum(np.einsum('ij,ij->i', blocks, blocks))])
+        return cumulative[hops_per_window:] - cumulative[:-hops_per_window]
+    squared = np.square(y, dtype=np.float64)
+    cumulative = np.concatenate([[0.0], np.cumsum(squared)])
+    starts = np.arange(0, len(y) - window_size + 1, hop)
+    return cumulative[starts + window_size] - cumulative[starts]
+
+
+def calculate_energy_per_window(y, window_duration=1, shift_duration=0.125, sr=16000):
+    """Same outputs as the notebook function, energies and energies per sample of every window,
+    for an array y sampled at sr"""
+    window_size = int(window_duration * sr)
+    energies = window_energies(y, window_size, int(shift_duration * sr))
+    return energies, energies / window_size
+
+
+def adaptive_gain(combined_energy, mixed_energy, alpha=1):
+    """Q of every window: alpha * sqrt(combined / mixed), capped at alpha"""
+    ratio = np.sqrt(np.asarray(combined_energy) / (np.asarray(mixed_energy) + 1e-10))
+    return alpha * np.minimum(ratio, 1)
+
+
+def window_weights(Q, nb_samples, window_size=window_length, hop=hop_length, scale=window_scale):
+    """Per sample weight scale * (sum of the Q of the windows covering it), window k covering
+    samples [k * hop, k * hop + window_size)"""
+    Q = np.asarray(Q, dtype=np.float64)
+    if len(Q) == 0:
+        # signal shorter than one window: no window adds anything, as in the notebook loop
+        return np.zeros(nb_samples)
+    if window_size % hop == 0:
+        # the weight only changes every hop samples: hop b is covered by windows b - hops_per_window + 1 .. b
+        nb_hops = -(-nb_samples // hop)
+        hop_weights = np.zeros(nb_hops)
+        covered = np.convolve(Q, np.ones(window_size // hop))[:nb_hops]
+        hop_weights[:len(covered)] = covered
+        return scale * np.repeat(hop_weights, hop)[:nb_samples]
+    starts = np.arange(len(Q)) * hop
+    ends = np.minimum(starts + window_size, nb_samples)
+    steps = np.zeros(nb_samples + 1)
+    np.add.at(steps, starts, Q)
+    np.add.at(steps, ends, -Q)
+    return scale * np.cumsum(steps[:-1])
+
+
+def adaptive_mix(combined, mixed, alpha=1, window_size=window_length, hop=hop_length, scale=window_scale,
+                 normalize=True):
+    """x[n] + Q * y[n] of automate_multifiles: combined is the HBN&LBN output x, mixed the noisy input y
+    (cut to the length of combined). Q is computed per window and the sum is peak normalized"""
+    mixed = mixed[:len(combined)]
+    Q = adaptive_gain(window_energies(combined, window_size, hop), window_energies(mixed, window_size, hop), alpha)
+    final = combined + window_weights(Q, len(mixed), window_size, hop, scale) * mixed
+    if normalize:
+        final = final / np.max(np.abs(final))
+    return final
+
+
+def global_mix(combined, mixed, alpha=1, normalize=True):
+    """The _obadded_ variant: one gain G1 = min(1, sqrt(combined energy / mixed energy)) for the whole file"""
+    mixed = mixed[:len(combined)]
+    G1 = adaptive_gain(calculate_energy(combined)[0], calculate_energy(mixed)[0], 1)
+    final = combined + alpha * G1 * mixed
+    if normalize:
+        final = final / np.max(np.abs(final))
+    return final
+
+
+class StreamingEnergy:
+    """Window energies of a signal given block by block. push returns the energies of the windows
+    completed by the block, the same values window_energies gives on the whole signal"""
+
+    def __init__(self, window_size=window_length, hop=hop_length):
+        self.window_size = window_size
+        self.hop = hop
+        self.reset()
+
+    def reset(self):
+        self._tail = np.zeros(0)  # samples from the start of the next window
+        self.nb_windows = 0
+
+    def push(self, block):
+        samples = np.concatenate([self._tail, block])
+        energies = window_energies(samples, self.window_size, self.hop)
+        self.nb_windows += len(energies)
+        # keep the samples from the start of the first window not computed yet
+        self._tail = samples[len(energies) * self.hop:]
+        return energies
+
+
+class StreamingAdaptiveGain:
+    """adaptive_mix computed block by block, without the final peak normalization. process takes
+    blocks of the same length of combined (x) and mixed (y) signals and returns the Q of the windows
+    completed by the block and the x + weight * y samples whose weight is final; the output is late
+    by at most window_size samples. flush returns the remaining samples at the end of the stream"""
+
+    def __init__(self, alpha=1, window_size=window_length, hop=hop_length, scale=window_scale):
+        self.alpha = alpha
+        self.window_size = window_size
+        self.hop = hop
+        self.scale = scale
+        self.combined_energy = StreamingEnergy(window_size, hop)
+        self.mixed_energy = StreamingEnergy(window_size, hop)
+        self.reset()
+
+    def reset(self):
+        self.combined_energy.reset()
+        self.mixed_energy.reset()
+        self._x = np.zeros(0)
+        self._y = np.zeros(0)
+        self._weights = np.zeros(0)
+        self._first = 0  # index in the stream of self._x[0]
+
+    def process(self, combined_block, mixed_block):
+        if len(combined_block) != len(mixed_block):
+            raise ValueError(f'blocks of different lengths: {len(combined_block)} != {len(mixed_block)}')
+        first_window = self.combined_energy.nb_windows
+        Q = adaptive_gain(self.combined_energy.push(combined_block), self.mixed_energy.push(mixed_block), self.alpha)
+
+        self._x = np.concatenate([self._x, combined_block])
+        self._y = np.concatenate([self._y, mixed_block])
+        self._weights = np.concatenate([self._weights, np.zeros(len(combined_block))])
+        if len(Q):
+            # windows start at (first_window + k) * hop in the stream, shifted to the pending samples
+            starts = (first_window + np.arange(len(Q))) * self.hop - self._first
+            ends = starts + self.window_size
+            steps = np.zeros(len(self._weights) + 1)
+            np.add.at(steps, starts, Q)
+            np.add.at(steps, ends, -Q)
+            self._weights += self.scale * np.cumsum(steps[:-1])
+
+        # later windows start at or after the next hop, the samples before it are done
+        nb_ready = self.combined_energy.nb_windows * self.hop - self._first
+        return Q, self._emit(nb_ready)
+
+    def flush(self):
+        return self._emit(len(self._x))
+
+    def _emit(self, nb_ready):
+        out = self._x[:nb_ready] + self._weights[:nb_ready] * self._y[:nb_ready]
+        self._x = self._x[nb_ready:]
+        self._y = self._y[nb_ready:]
+        self._weights = self._weights[nb_ready:]
+        self._first += nb_ready
+        return out
@@ -0,0 +1,82 @@
+# Shared audio decoding and resampling.
+# Decoding the LibriSpeech FLACs and resampling them to 8 kHz is the slowest part of data
+# preparation, and it used to be redone one file at a time on every run. Files are decoded
+# in a process pool and the resampled float32 samples are kept in an on-disk cache keyed by
+# (path, mtime, size, target sample rate), so later runs only read .npy files.
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+import librosa
+import numpy as np
+
+default_cache_dir = os.environ.get('AUDIO_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'lit_audio'))
+
+
+def cache_path(path, sr, cache_dir=default_cache_dir):
+    """Returns the cache file of path resampled at sr; it changes whenever the file is modified"""
+    stat = os.stat(path)
+    key = f'{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}|{sr}'
+    return os.path.join(cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.npy')
+
+
+def load_audio(path, sr=8000, cache_dir=default_cache_dir, mmap=False):
+    """This function returns the mono float32 samples of path resampled at sr, like librosa.load(path, sr=sr)[0].
+    The result is read from / written to cache_dir, cache_dir=None disables the cache.
+    mmap=True returns a read-only memory map of the cached samples"""
+    if cache_dir is None:
+        return librosa.load(path, sr=sr)[0]
+
+    cached = cache_path(path, sr, cache_dir)
+    if not os.path.exists(cached):
+        y, _ = librosa.load(path, sr=sr)
+        os.makedirs(cache_dir, exist_ok=True)
+        # write to a file of this process then rename, so a reader never sees half a file
+        tmp_path = f'{cached[:-len(".npy")]}_{os.getpid()}_tmp.npy'
+        np.save(tmp_path, y.astype(np.float32, copy=False))
+        os.replace(tmp_path, cached)
+        if not mmap:
+            return y
+    return np.load(cached, mmap_mode='r' if mmap else None)
+
+
+def _decode_to_cache(args):
+    path, sr, cache_dir = args
+    cached = cache_path(path, sr, cache_dir)
+    if not os.path.exists(cached):
+        load_audio(path, sr, cache_dir)
+    return cached
+
+
+def cache_many(paths, sr=8000, cache_dir=default_cache_dir, workers=None):
+    """This function makes sure every file of paths is in the cache, decoding the missing ones
+    with `workers` processes (all cores by default), and returns their cache files in order"""
+    paths = list(paths)
+    missing = [path for path in paths if not os.path.exists(cache_path(path, sr, cache_dir))]
+    if len(missing) > 1 and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(_decode_to_cache, [(path, sr, cache_dir) for path in missing], chunksize=4))
+    else:
+        for path in missing:
+            _decode_to_cache((path, sr, cache_dir))
+    return [cache_path(path, sr, cache_dir) for path in paths]
+
+
+def load_many(paths, sr=8000, cache_dir=default_cache_dir, workers=None):
+    """This function returns the samples of every file of paths resampled at sr, in the same order.
+    Files are decoded by `workers` processes (all cores by default); with a cache the workers
+    hand back cache files rather than pickled arrays"""
+    paths = list(paths)
+    if cache_dir is None:
+        if workers == 1:
+            return [load_audio(path, sr, None) for path in paths]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(load_audio, paths, [sr] * len(paths), [None] * len(paths), chunksize=4))
+    return [np.load(cached) for cached in cache_many(paths, sr, cache_dir, workers)]
+
+
+def corpus_duration(audio_dir, sr=8000, cache_dir=default_cache_dir, workers=None):
+    """Returns the number of audio files in audio_dir and their total duration in seconds"""
+    list_files = [os.path.join(audio_dir, file) for file in sorted(os.listdir(audio_dir)) if file != '.DS_Store']
+    # only the .npy headers are read once the files are cached
+    total = sum(np.load(cached, mmap_mode='r').shape[0] for cached in cache_many(list_files, sr, cache_dir, workers))
+    return len(list_files), total / sr
@@ -2,48 +2,123 @@ import pandas as pd
 import numpy as np
 import argparse
 import os
+from concurrent.futures import ProcessPoolExecutor
 import matplotlib.pyplot as plt
 from openpyxl import load_workbook
 from openpyxl.styles import PatternFill
 
+'''
+Stacked bar graph and TAR/WAR summary of the processed_*.xlsx files written by rearrange_updated.py.
+Each file is read once. The mixed W.A.R. of every file index is put in one of the 10 bins
+(90-100, 80-90, ..., 0-10) and the processed W.A.R. compared with all the thresholds at once,
+which gives a (bins x thresholds) count matrix; the bars and the summary table come from it.
+
+To show the graphs one by one:
+python bar_graph.py /path/to/processed/
+To save them as png files instead, with 4 processes (no window is opened):
+python bar_graph.py /path/to/processed/ --plot-dir graphs/ --workers 4
+'''
+
+thresholds = [90, 80, 70, -1]  # -1 counts the processed W.A.R. below 70%
+colors = ['r', 'g', 'b', 'k']
+bin_starts = np.arange(90, -1, -10)  # bin i holds the mixed W.A.R. in [bin_starts[i], bin_starts[i] + 10), 90-100 included
+bin_edges = np.append(np.arange(0, 100, 10), 101)
+x_labels = ['90%', '80%', '70%', '60%', '50%', '40%', '30%', '20%', '10%', '0%']
+
+
+def read_war(file_path):
+    """Mixed and processed W.A.R. of a processed_*.xlsx file, without its Average rows"""
+    df = pd.read_excel(file_path)
+    df = df[df['File index'] != 'Average']
+    return df['Mixed W.A.R. (%)'].to_numpy(dtype=float), df['Processed W.A.R. (%)'].to_numpy(dtype=float)
+
+
+def threshold_counts(war_mixed, war_proc, thresholds=thresholds):
+    """Returns counts, a (10, len(thresholds)) matrix with the number of files of each mixed W.A.R. bin
+    whose processed W.A.R. is >= threshold (< 70 for -1), and totals, the number of files of each bin"""
+    # np.digitize gives 1..10 inside [0, 101), bin 90-100 first
+    bins = len(bin_starts) - np.digitize(war_mixed, bin_edges)
+    inside = (bins >= 0) & (bins < len(bin_starts))
+    limits = np.array([threshold if threshold != -1 else 70 for threshold in thresholds])
+    above = war_proc[:, np.newaxis] >= limits
+    hits = np.where(np.array(thresholds) != -1, above, ~above & ~np.isnan(war_proc)[:, np.newaxis])
+
+    counts = np.zeros((len(bin_starts), len(thresholds)), dtype=int)
+    np.add.at(counts, bins[inside], hits[inside])
+    totals = np.bincount(bins[inside], minlength=len(bin_starts))
+    return counts, totals
+
+
 def graph(input_dir, filename, threshold):
     if filename.startswith('~$'):
         print(f"Skipping temporary file: {filename}")
         return []
 
-    input_file_path = os.path.join(input_dir, filename)
-    df = pd.read_excel(input_file_path)
-
-    war_mixed_list = []
-    war_proc_list = []
-
-    for index, row in df.iterrows():
-        if row['File index'] != 'Average':  # Skip appending the last row
-            war_mixed_list.append(row['Mixed W.A.R. (%)'])
-            war_proc_list.append(row['Processed W.A.R. (%)'])
-
-    mixed_avg = round(np.average(war_mixed_list))
-    proc_avg = round(np.average(war_proc_list))
+    war_mixed, war_proc = read_war(os.path.join(input_dir, filename))
+    counts, totals = threshold_counts(war_mixed, war_proc, [threshold])
+    results = percentages(counts, totals)[:, 0].tolist()
+    expand_res = list(zip(counts[:, 0], totals))
+    return results, expand_res, round(np.average(war_mixed)), round(np.average(war_proc))
+
+
+def percentages(counts, totals):
+    """Share (%) of the files of each bin above each threshold, 0 for empty bins"""
+    return np.divide(counts * 100, totals[:, np.newaxis], out=np.zeros(counts.shape), where=totals[:, np.newaxis] > 0)
+
+
+def file_summary(file, war_mixed, war_proc, counts, totals):
+    """Row of the summary table: TAR(M) is the number of files with a mixed W.A.R. of 90% or more,
+    TAR(P) the number of files with a processed W.A.R. of 90% or more, TAR(D) the figure of merit"""
+    mixed_avg = round(np.average(war_mixed))
+    proc_avg = round(np.average(war_proc))
+    sum_of_red = int(counts[:, thresholds.index(90)].sum())
+    denom_of_90 = int(totals[0])
+    FOM = round(((sum_of_red / denom_of_90) - 1) * 100) if denom_of_90 else np.nan
+    return {'filename': file, 'WAR(M)': mixed_avg, 'WAR(P)': proc_avg, 'WAR(D)': proc_avg - mixed_avg,
+            'TAR(M)': denom_of_90, 'TAR(P)': sum_of_red, 'TAR(D)': FOM}
+
+
+def plot_counts(file, counts, totals, output_file=None):
+    """Bar graph of the counts of one file, shown, or saved to output_file"""
+    fig, ax = plt.subplots(figsize=(10, 6))
+    width = 0.2  # width of the bars
+    x = np.arange(len(bin_starts))  # the label locations
+    results = percentages(counts, totals)
+
+    for i, threshold in enumerate(thresholds):
+        bars = ax.bar(x + i * width, results[:, i], width, label=(f'WAR >= {threshold}%' if threshold != -1 else "WAR < 70%"), color=colors[i])
+        for bar, count_ge_i, total_keys_i in zip(bars, counts[:, i], totals):
+            ax.text(bar.get_x() + bar.get_width() / 2, bar.get_height() + 1, f"{count_ge_i}/{total_keys_i}", ha='center', va='bottom')
+
+    ax.set_ylabel('Processed W.A.R. %')
+    ax.set_xlabel('W.A.R. on Original')
+    ax.set_title(f'Bar Graph of Processed WAR% >= Thresholds vs. Original WAR% for {file}')
+    ax.set_xticks(x + width)
+    ax.set_xticklabels(x_labels)
+    ax.legend()
+    ax.set_ylim(0, 120)
+    plt.tight_layout()
+    if output_file is None:
+        plt.show()
+    else:
+        fig.savefig(output_file)
+    plt.close(fig)
 
-    results = []
-    expand_res = []
 
-    for i in range(90, -1, -10):
-        keys_over_i = [war_proc for war_mixed, war_proc in zip(war_mixed_list, war_proc_list) if (war_mixed >= i and war_mixed < (i + (11 if i == 90 else 10)))]
-        if threshold != -1:
-            count_ge_threshold = np.sum(np.array(keys_over_i) >= threshold)
-        else:
-            count_ge_threshold = np.sum(np.array(keys_over_i) < 70)
+def summarize_file(input_dir, file, plot_dir=None, show=False):
+    """Reads one file, plots it (shown if show, saved in plot_dir if given) and returns its summary row"""
+    war_mixed, war_proc = read_war(os.path.join(input_dir, file))
+    counts, totals = threshold_counts(war_mixed, war_proc)
+    if show:
+        plot_counts(file, counts, totals)
+    elif plot_dir is not None:
+        plot_counts(file, counts, totals, os.path.join(plot_dir, os.path.splitext(file)[0] + '.png'))
+    return file_summary(file, war_mixed, war_proc, counts, totals)
 
-        if count_ge_threshold == 0 or len(keys_over_i) == 0:
-            percentage_ge_threshold = 0
-        else:
-            percentage_ge_threshold = (count_ge_threshold / len(keys_over_i)) * 100
 
-        results.append(percentage_ge_threshold)
-        expand_res.append((count_ge_threshold, len(keys_over_i)))
+def _headless():
+    plt.switch_backend('Agg')
 
-    return results, expand_res, mixed_avg, proc_avg
 
 def read_excel_without_last_row(file_path):
     df = pd.read_excel(file_path)
@@ -63,74 +138,36 @@ def highlight_row(writer, sheet_name, row_index):
     worksheet = writer.sheets[sheet_name]
     highlight_fill = PatternFill(start_color="90EE90", end_color="90EE90", fill_type="solid")
 
-    for row in worksheet.iter_rows(min_row=row_index, max_row=row_index): 
+    for row in worksheet.iter_rows(min_row=row_index, max_row=row_index):
         for cell in row:
             cell.fill = highlight_fill
 
 def main():
     parser = argparse.ArgumentParser(description='Process Excel files and generate a stacked bar graph.')
     parser.add_argument('input_dir', type=str, help='Directory where input Excel files are located')
+    parser.add_argument('--plot-dir', dest='plot_dir', type=str, help='Save the graphs as png files in this directory instead of showing them')
+    parser.add_argument('--no-plots', dest='plots', action='store_false', help='Only write the summary table')
+    parser.add_argument('--workers', type=int, default=1, help='Number of processes when the graphs are not shown')
     args = parser.parse_args()
 
     input_dir = args.input_dir
-    excel_files = [file for file in os.listdir(input_dir) if file.endswith('.xlsx') or file.endswith('.xls')]
-
-    results_table = []
-
-    for file in excel_files:
-        df = read_excel_without_last_row(os.path.join(input_dir, file))
-
-        thresholds = [90, 80, 70, -1]
-        colors = ['r', 'g', 'b', 'k']
-
-        fig, ax = plt.subplots(figsize=(10, 6))
-
-        width = 0.2  # width of the bars
-        x = np.arange(10)  # the label locations
-        x_labels = ['90%', '80%', '70%', '60%', '50%', '40%', '30%', '20%', '10%', '0%']
-
-        sum_of_red = 0
-        denom_of_90 = 0
-
-        file_results = {
-            'filename': file,
-            'High Processed Tail': 0,
-            'High Mixed Tail': 0,
-            'Figure of Merit': 0,
-            'Average Mixed WAR': 0,
-            'Average Processed WAR': 0,
-            'Average Improvement': 0
-        }
-
-        for i, threshold in enumerate(thresholds):
-            results, expand_res, mixed_avg, proc_avg = graph(input_dir, file, threshold)
-            denom_of_90 = expand_res[0][1]
-            bars = ax.bar(x + i * width, results, width, label=(f'WAR >= {threshold}%' if threshold != -1 else "WAR < 70%"), color=colors[i])
-            for bar, result in zip(bars, expand_res):
-                count_ge_i, total_keys_i = result
-                ax.text(bar.get_x() + bar.get_width() / 2, bar.get_height() + 1, f"{count_ge_i}/{total_keys_i}", ha='center', va='bottom')
-                if threshold == 90:
-                    sum_of_red += count_ge_i
-
-        FOM = round(((sum_of_red / denom_of_90) - 1) * 100)
-        file_results['TAR(P)'] = sum_of_red
-        file_results['TAR(M)'] = denom_of_90
-        file_results['TAR(D)'] = FOM
-        file_results['WAR(M)'] = mixed_avg
-        file_results['WAR(P)'] = proc_avg
-        file_results['WAR(D)'] = proc_avg - mixed_avg
-
-        results_table.append(file_results)
-
-        ax.set_ylabel('Processed W.A.R. %')
-        ax.set_xlabel('W.A.R. on Original')
-        ax.set_title(f'Bar Graph of Processed WAR% >= Thresholds vs. Original WAR% for {file}')
-        ax.set_xticks(x + width)
-        ax.set_xticklabels(x_labels)
-        ax.legend()
-        ax.set_ylim(0, 120)
-        plt.tight_layout()
-        plt.show()
+    excel_files = [file for file in os.listdir(input_dir) if (file.endswith('.xlsx') or file.endswith('.xls'))
+                   and not file.startswith('~$') and file != 'results_summary.xlsx']
+
+    show = args.plots and args.plot_dir is None
+    plot_dir = args.plot_dir if args.plots else None
+    if plot_dir is not None:
+        os.makedirs(plot_dir, exist_ok=True)
+
+    if show or args.workers <= 1:
+        if not show:
+            _headless()
+        results_table = [summarize_file(input_dir, file, plot_dir, show) for file in excel_files]
+    else:
+        # headless: every process renders its own figures with the Agg backend
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_headless) as pool:
+            results_table = list(pool.map(summarize_file, [input_dir] * len(excel_files), excel_files,
+                                          [plot_dir] * len(excel_files), chunksize=max(1, len(excel_files) // (4 * args.workers))))
 
     # Convert results to a DataFrame and sort by filename
     results_df = pd.DataFrame(results_table)
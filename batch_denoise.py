@@ -0,0 +1,174 @@
+import argparse
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+import librosa
+import numpy as np
+import soundfile as sf
+from denoise import (DenoiseSession, audio_to_audio_frame_stack, frame_length, frames_to_network_input,
+                     hop_length_frame, network_output_to_frames, sample_rate)
+
+'''
+Cross-file micro-batching for the U-Net.
+A single noisy clip only gives the network a handful of 128x128 spectrogram frames, so
+calling predict once per file leaves most of the CPU idle. BatchScheduler queues the
+frames of every submitted clip, runs the network on fixed-size batches made of frames
+from many clips, and hands each clip its denoised audio back through a Future once all
+of its frames have been predicted. A batch that is not full is run anyway once its
+oldest frame has waited max_wait seconds.
+
+To denoise every _mixed_8k_ file of a folder and report throughput at several batch sizes:
+python batch_denoise.py /content/ --batch-sizes 1 8 32 64 --cpu -o /content/proc/
+'''
+
+
+class _Request:
+    def __init__(self, key, audio):
+        self.key = key
+        frames = audio_to_audio_frame_stack(audio, frame_length, hop_length_frame)
+        self.m_amp_db, self.m_phase, self.X_in = frames_to_network_input(frames)
+        self.X_pred = np.empty(self.X_in.shape, dtype=np.float32)
+        self.nb_done = 0
+        self.arrival = time.perf_counter()
+        self.future = Future()
+
+
+class BatchScheduler:
+    def __init__(self, session, batch_size: int = 32, max_wait: float = 0.05, output_gain: float = 10):
+        self.session = session  # DenoiseSession or anything with a keras-like predict
+        self.batch_size: int = batch_size
+        self.output_gain: float = output_gain  # applied to the denoised audio, as in prediction()
+        self.max_wait: float = max_wait  # seconds a frame may wait for the batch to fill up
+        self.queue = queue.Queue()
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def submit(self, key, audio) -> Future:
+        """Queue a 1D numpy audio at sample_rate, the Future resolves to its denoised audio"""
+        if len(audio) < frame_length:
+            raise ValueError(f'{key}: audio has {len(audio)} samples, at least {frame_length} are needed')
+        # The spectrograms are computed in the caller thread, the worker only runs the network
+        request = _Request(key, audio)
+        self.queue.put(request)
+        return request.future
+
+    def close(self):
+        """Run whatever is still queued and stop the worker"""
+        self.queue.put(None)
+        self.worker.join()
+
+    def _run(self):
+        pending = deque()  # (request, frame index) waiting for a batch
+        stopping = False
+        while not stopping or pending:
+            if not stopping:
+                timeout = None
+                if pending:
+                    timeout = max(0.0, pending[0][0].arrival + self.max_wait - time.perf_counter())
+                try:
+                    request = self.queue.get(timeout=timeout)
+                    if request is None:
+                        stopping = True
+                    else:
+                        pending.extend((request, i) for i in range(len(request.X_in)))
+                except queue.Empty:
+                    pass
+
+            while pending and (len(pending) >= self.batch_size or stopping or
+                               time.perf_counter() >= pending[0][0].arrival + self.max_wait):
+                batch = [pending.popleft() for _ in range(min(self.batch_size, len(pending)))]
+                self._predict_batch(batch)
+
+    def _predict_batch(self, batch):
+        requests = {id(request): request for request, _ in batch}
+        try:
+            X_in = np.stack([request.X_in[i] for request, i in batch])
+            X_pred = self.session.predict(X_in, verbose=0)
+        except Exception as e:
+            for request in requests.values():
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+
+        # Split the predictions back out to the clip each frame came from
+        for (request, i), pred in zip(batch, X_pred):
+            request.X_pred[i] = pred
+            request.nb_done += 1
+        for request in requests.values():
+            if request.nb_done == len(request.X_in) and not request.future.done():
+                try:
+                    frames = network_output_to_frames(request.m_amp_db, request.m_phase, request.X_pred, frame_length)
+                    request.future.set_result(frames.reshape(-1) * self.output_gain)
+                except Exception as e:
+                    request.future.set_exception(e)
+
+
+def denoise_files(session, audio_dir, list_audio_files, batch_size=32, max_wait=0.05):
+    """This function denoises every file of list_audio_files through one BatchScheduler
+    and returns a dictionary of file name -> denoised audio"""
+    with BatchScheduler(session, batch_size=batch_size, max_wait=max_wait) as scheduler:
+        futures = {}
+        for file in list_audio_files:
+            y, _ = librosa.load(os.path.join(audio_dir, file), sr=sample_rate)
+            if len(y) < frame_length:
+                print(f"The following file {os.path.join(audio_dir, file)} is below the min duration")
+                continue
+            futures[file] = scheduler.submit(file, y)
+    return {file: future.result() for file, future in futures.items()}
+
+
+def benchmark(session, list_audio, batch_sizes=(1, 8, 32, 64), max_wait=0.05):
+    """This function denoises the same clips with each batch size and returns the throughput in clips per second"""
+    results = {}
+    for batch_size in batch_sizes:
+        start = time.perf_counter()
+        with BatchScheduler(session, batch_size=batch_size, max_wait=max_wait) as scheduler:
+            futures = [scheduler.submit(i, audio) for i, audio in enumerate(list_audio)]
+        for future in futures:
+            future.result()
+        results[batch_size] = len(list_audio) / (time.perf_counter() - start)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Denoise many clips with cross-file batches and report throughput.')
+    parser.add_argument('input_dir', type=str, help='Directory containing the 8 kHz noisy .wav files')
+    parser.add_argument('--pattern', type=str, default='_mixed_8k_', help='Only files whose name contains this are denoised')
+    parser.add_argument('--batch-sizes', dest='batch_sizes', type=int, nargs='+', default=[1, 8, 32, 64], help='Batch sizes to benchmark')
+    parser.add_argument('--max-wait', dest='max_wait', type=float, default=0.05, help='Seconds a frame may wait for its batch to fill up')
+    parser.add_argument('--cpu', action='store_true', help='Hide the GPUs from tensorflow')
+    parser.add_argument('-o', dest='output_dir', type=str, help='If set, write the denoised files (mixed_8k -> proc) to this directory')
+    args = parser.parse_args()
+
+    if args.cpu:
+        os.environ['CUDA_VISIBLE_DEVICES'] = ''
+
+    list_audio_files = sorted(file for file in os.listdir(args.input_dir)
+                              if file.endswith('.wav') and args.pattern in file)
+    print(f'Found {len(list_audio_files)} files')
+    session = DenoiseSession(warmup=True)
+
+    list_audio = [librosa.load(os.path.join(args.input_dir, file), sr=sample_rate)[0] for file in list_audio_files]
+    list_audio = [audio for audio in list_audio if len(audio) >= frame_length]
+    for batch_size, clips_per_second in benchmark(session, list_audio, args.batch_sizes, args.max_wait).items():
+        print(f'batch size {batch_size}: {clips_per_second:.2f} clips/s')
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+        batch_size = max(args.batch_sizes)
+        for file, denoised in denoise_files(session, args.input_dir, list_audio_files, batch_size, args.max_wait).items():
+            sf.write(os.path.join(args.output_dir, file.replace('mixed_8k', 'proc')), denoised, sample_rate, 'PCM_24')
+        print(f'Saved output to {args.output_dir}')
+
+
+if __name__ == "__main__":
+    main()
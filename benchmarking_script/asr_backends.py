@@ -0,0 +1,130 @@
+import os
+import time
+import numpy as np
+'''
+ASR backends used by speech_to_text.py and asr_multi_threading.py.
+
+Every backend turns the audio of one file, a 16 bit pydub.AudioSegment already read (and normalized)
+by speech_to_text.read_audio, into a list of {"transcript", "confidence"} results, the format
+transcribeGoogle always returned. It also says how it should be run concurrently:
+executor = 'thread' for remote APIs that mostly wait on the network,
+executor = 'process' for local models that keep a CPU busy.
+max_workers is the number of threads / processes asr_multi_threading uses for it.
+
+Backends:
+google  : Google Cloud Speech-to-Text (google_stt.py), needs the credentials and a network
+whisper : local Whisper model (whisper_stt.py), loaded once in each worker process
+stub    : no ASR at all, returns a fixed transcript or echoes the reference .txt of each file.
+          Runs offline at a predictable speed, to check or time the rest of the harness
+'''
+
+
+class ASRBackend:
+    name = None
+    executor = 'thread'
+    max_workers = 8
+    # files longer than this (s) are still sent, but a warning is printed
+    max_duration = None
+    # settings that change the transcripts, part of the key of transcript_cache
+    model_id = ''
+
+    def setup(self, nb_workers=1):
+        """Called once in each worker before the first file, loads whatever the backend needs"""
+
+    def transcribe(self, audio, filename):
+        """audio is the pydub.AudioSegment of filename, filename is only used for logging / lookups"""
+        raise NotImplementedError
+
+
+class GoogleBackend(ASRBackend):
+    name = 'google'
+    executor = 'thread'
+    max_workers = 100
+    max_duration = 60
+
+    def transcribe(self, audio, filename):
+        # imported here so the other backends work without google-cloud-speech
+        from google_stt import transcribeGoogle
+        # the raw 16 bit PCM is sent as LINEAR16, the file is not read again
+        return transcribeGoogle(filename, channels=audio.channels, samplerate=audio.frame_rate,
+                                content=audio.raw_data)
+
+
+class WhisperBackend(ASRBackend):
+    name = 'whisper'
+    executor = 'process'
+
+    def __init__(self, model_name='base'):
+        self.model_name = model_name
+        self.model = None
+
+    @property
+    def model_id(self):
+        return self.model_name
+
+    @property
+    def max_workers(self):
+        # torch already spreads one decode over several cores, a few processes are enough
+        return max(1, (os.cpu_count() or 1) // 4)
+
+    def setup(self, nb_workers=1):
+        import torch
+        from whisper_stt import load_whisper
+        # share the cores between the worker processes instead of each one using all of them
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // nb_workers))
+        self.model = load_whisper(self.model_name)
+
+    def transcribe(self, audio, filename):
+        from whisper_stt import transcribeWhisper
+        if self.model is None:
+            self.setup()
+        # the format whisper.load_audio gives (mono, 16 kHz, float in [-1, 1)), but converted by pydub
+        # (audioop) from the normalized segment, not decoded again by ffmpeg: the resampling differs
+        # slightly, so transcripts can differ a little from whisper_stt.py run on the file
+        audio = audio.set_channels(1).set_frame_rate(16000)
+        samples = np.array(audio.get_array_of_samples(), dtype=np.float32) / 32768.0
+        return transcribeWhisper(filename, model=self.model, audio=samples)
+
+    def __getstate__(self):
+        # worker processes get the model name and load the model themselves
+        return {'model_name': self.model_name, 'model': None}
+
+
+class StubBackend(ASRBackend):
+    name = 'stub'
+    executor = 'thread'
+
+    def __init__(self, transcript='', text_dir=None, delay=0.0):
+        """transcript is returned for every file. With text_dir, the reference <prefix>.txt of the file
+        (prefix = part of its name before the first '_', as in tabulate_audiofiles.py) is returned
+        instead, which should get a perfect W.A.R. delay (s) emulates the time a real ASR takes"""
+        self.transcript = transcript
+        self.text_dir = text_dir
+        self.delay = delay
+
+    @property
+    def model_id(self):
+        return f'text_dir={self.text_dir}' if self.text_dir is not None else f'transcript={self.transcript}'
+
+    def transcribe(self, audio, filename):
+        if self.delay:
+            time.sleep(self.delay)
+        transcript = self.transcript
+        if self.text_dir is not None:
+            txt_path = os.path.join(self.text_dir, os.path.basename(filename).split('_')[0] + '.txt')
+            with open(txt_path, 'r', encoding='utf8') as file:
+                transcript = file.read().strip()
+        return [{"transcript": transcript, "confidence": 1.0}]
+
+
+backends = {backend.name: backend for backend in (GoogleBackend, WhisperBackend, StubBackend)}
+
+
+def get_backend(api, **kwargs):
+    """Returns the backend named api (google, whisper or stub) built with kwargs.
+    A backend instance is returned as is"""
+    if isinstance(api, ASRBackend):
+        return api
+    if api not in backends:
+        raise ValueError(f'Unknown ASR backend {api!r}, expected one of {", ".join(backends)}')
+    return backends[api](**kwargs)
@@ -0,0 +1,107 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import speech_to_text
+import asr_performance
+import transcript_cache
+from wer_scoring import Reference
+import pandas as pd
+from tqdm import tqdm
+from asr_backends import get_backend
+'''
+This file is producer multi-threading program that allows for concurrent data processing;
+which in turn speeds up the process for SpeechToText and ASR_performance.
+The audio files are handed to a pool of workers whose kind and size come from the ASR backend
+(see asr_backends.py):
+a. remote APIs (google) wait on the network, they run in a pool of threads
+b. local models (whisper) keep a CPU busy, they run in a pool of processes; each process loads
+   the model once and uses it for every file it is given
+Results are collected as they complete:
+a. we do not care for the order of tasks being processed
+b. it does not wait for the tasks to be fully compiled before processing
+c. works with the progress bar library tqdm
+The workers only transcribe; the transcripts are scored together against the reference, prepared
+once (wer_scoring.Reference), in this process.
+With a transcript cache (see transcript_cache.py), files whose audio was already transcribed with
+the same backend settings are scored from the cache and never sent to the ASR.
+'''
+
+# backend of the current worker process, set by _init_worker
+_worker_backend = None
+
+
+def _init_worker(backend, nb_workers):
+    global _worker_backend
+    _worker_backend = backend
+    _worker_backend.setup(nb_workers)
+
+
+def transcribe_file(backend, path: str, normalize=True, retries=2) -> list:
+    """Transcript tokens of one file"""
+    _, _, script = speech_to_text.transcribe(list_filenames=[path], api=backend, retries=retries, normalize=normalize)
+    return script[0]
+
+
+def _transcribe_in_worker(path, normalize, retries):
+    return transcribe_file(_worker_backend, path, normalize, retries)
+
+
+class MultiThreading:
+    def __init__(self, asr_type, refData: str, lenRefData_lines: int, normalize = True, workers=None, retries=2,
+                 cache_path=None, alignment_writer=None):
+        self.backend = get_backend(asr_type)  # backend name or asr_backends.ASRBackend
+        self.refData: str = refData  # string of reference text
+        self.reference = Reference(refData)  # reference text transformed once for all the files
+        self.lenRefData_lines: int = lenRefData_lines  # length of strings in reference text
+        self.normalize = normalize # if true, normalize files before sending to ASR
+        self.workers = workers or self.backend.max_workers  # default: the backend's limit
+        self.retries = retries
+        self.cache_path = cache_path  # transcript cache, None to transcribe every file
+        self.alignment_writer = alignment_writer  # wer_scoring.AlignmentWriter, None to append to alignments.txt
+
+    def run(self, paths: list[str]) -> pd.DataFrame:
+        transcripts = {}  # path: tokens
+        todo = list(paths)
+        hashes = None
+
+        if self.cache_path is not None:
+            hashes = {path: transcript_cache.file_hash(path) for path in paths}
+            cached = transcript_cache.lookup(hashes.values(), self.backend, self.normalize, self.cache_path)
+            todo = [path for path in paths if hashes[path] not in cached]
+            print(f'{len(paths) - len(todo)} transcripts found in {self.cache_path}, {len(todo)} files to transcribe')
+            transcripts.update((path, cached[hashes[path]]) for path in paths if hashes[path] in cached)
+
+        if todo:
+            transcripts.update(self.transcribe_all(todo, hashes))
+
+        print('ASR operation complete!')
+        return asr_performance.calculation(
+            files_info=list(transcripts), transcriptions=list(transcripts.values()),
+            reference_data=self.refData, lenRef=self.lenRefData_lines,
+            reference=self.reference, alignment_writer=self.alignment_writer)
+
+    def transcribe_all(self, paths: list[str], hashes=None) -> dict:
+        transcripts = {}
+        total_tasks = len(paths)
+        nb_workers = max(1, min(self.workers, total_tasks))
+
+        if self.backend.executor == 'process':
+            pool = ProcessPoolExecutor(max_workers=nb_workers, initializer=_init_worker,
+                                       initargs=(self.backend, nb_workers))
+            task = _transcribe_in_worker
+        else:
+            self.backend.setup(1)  # threads share the backend of this process
+            pool = ThreadPoolExecutor(max_workers=nb_workers)
+            task = self.consumer
+
+        with tqdm(total=total_tasks, desc="Processing") as progress_bar, pool:
+            futures = {pool.submit(task, path, self.normalize, self.retries): path for path in paths}
+            for future in as_completed(futures):
+                path = futures[future]
+                transcripts[path] = future.result()
+                if hashes is not None:
+                    # saved right away, an interrupted run does not lose it
+                    transcript_cache.save(hashes[path], transcripts[path], self.backend, self.normalize, path, self.cache_path)
+                progress_bar.update(1)  # Increment by one for each completed task
+        return transcripts
+
+    def consumer(self, path: str, normalize, retries) -> list:
+        return transcribe_file(self.backend, path, normalize, retries)
@@ -0,0 +1,75 @@
+import os
+import sys
+from google.cloud import speech
+
+
+##############################################################################
+# NOTE: You need to pip install google-cloud-speech before using this script.
+# pip install google-cloud-speech
+#
+# NOTE: This script takes a directory with 16kHz, 16bit pcm, .wav files or .ogg files.
+##############################################################################
+
+
+# NOTE: You need set GOOGLE_APPLICATION_CREDENTIALS to path of your credential
+# you can get it from the google cloud platform project python speech to text
+CREDENTIALS_PATH = 'pythonspeechtotext-331614-6c46bea8f6b0.json'
+
+
+# NOTE: Input files sampling rate.
+SAMPLING_RATE = 16000
+
+
+# This code is from https://cloud.google.com/speech-to-text/docs/samples/speech-transcribe-async#speech_transcribe_async-python
+def transcribeGoogle(speechFile: str, channels: int, samplerate: int, content: bytes = None):
+    """Transcribe the given audio file asynchronously.
+    content, if given, is the 16 bit PCM of the audio already in memory and speechFile is not read."""
+    os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = CREDENTIALS_PATH
+
+    try:
+        client = speech.SpeechClient()
+    except ValueError as err:
+        print("Error when making client!")
+        print(f"Unexpected {err=}, {type(err)=}", file=sys.stderr)
+        raise
+
+    if content is None:
+        with open(speechFile, "rb") as audio_file:
+            content = audio_file.read()
+        fileType = speech.RecognitionConfig.AudioEncoding.LINEAR16 if (speechFile[-4:] == '.wav') else speech.RecognitionConfig.AudioEncoding.OGG_OPUS
+    else:
+        fileType = speech.RecognitionConfig.AudioEncoding.LINEAR16
+
+    """
+    Note that transcription is limited to a 60 seconds audio file.
+    Use a GCS file for audio longer than 1 minute.
+    """
+    audio = speech.RecognitionAudio(content=content)
+    config = speech.RecognitionConfig(
+        encoding=fileType,
+        sample_rate_hertz=samplerate,
+        language_code="en-US",
+        model="latest_long",
+        audio_channel_count=channels,
+        # use_enhanced=True
+    )
+
+    operation = client.long_running_recognize(config=config, audio=audio)
+
+    # print("Waiting for ASR operation to complete...")
+    response = operation.result(timeout=90)
+
+    # Each result is for a consecutive portion of the audio. Iterate through
+    # them to get the transcripts for the entire audio file.
+    # for result in response.results:
+    #     # The first alternative is the most likely one for this portion.
+    #     print(u"Transcript: {}".format(result.alternatives[0].transcript))
+    #     print("Confidence: {}".format(result.alternatives[0].confidence))
+
+    return [
+        {
+            "transcript": res.alternatives[0].transcript,
+            "confidence": res.alternatives[0].confidence
+        }
+        for res in response.results
+    ]
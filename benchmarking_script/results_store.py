@@ -0,0 +1,196 @@
+import argparse
+import os
+import sqlite3
+import time
+import pandas as pd
+'''
+One SQLite file holding the per-utterance results of every scoring run, for the
+tabulate_audiofiles -> rearrange -> bar_graph pipeline.
+Results used to go through several Excel round trips (*_output.xlsx, processed_*.xlsx, then
+bar_graph and summary reading them all again); reading and writing them with openpyxl was most
+of the analysis time. Rows are appended here once, with the utterance id, dB level, repetition
+and variant parsed from the file name, and the tables are computed with group-bys.
+Excel is only an export.
+
+Audio file names are <utterance>_<variant>_<dB>db_<repetition>.wav, '+' may separate the
+variant from the dB level (174-50561-0010_mixed+-12db_5.wav), the channel1_normalized_ prefix
+of older runs is ignored.
+
+To run:
+Import the *_output.xlsx of older runs:
+python results_store.py results.sqlite --import-excel /path/to/excel/
+Per dB level and TAR/WAR tables, optionally exported to Excel:
+python results_store.py results.sqlite --summary --export summary.xlsx
+'''
+
+default_store = 'results.sqlite'
+table_name = 'results'
+name_pattern = r'^(?:channel1_normalized_)?(?P<utterance>[^_]+)_(?P<variant>.+?)[_+](?P<db>-?\d+)db(?:_(?P<rep>\d+))?$'
+columns = ['source', 'path', 'file', 'utterance', 'variant', 'db', 'rep', 'war', 'deletion', 'insertion',
+           'substitution', 'transcript', 'reference', 'run']
+
+
+def parse_file_names(file_names) -> pd.DataFrame:
+    """Parses utterance, variant, dB level and repetition out of every file name, in one pass.
+    Names that do not follow the pattern get empty fields"""
+    stems = pd.Series(file_names, dtype='object').astype(str).str.replace(r'\.wav$', '', regex=True)
+    parsed = stems.str.extract(name_pattern)
+    parsed['db'] = pd.to_numeric(parsed['db'], errors='coerce').astype('Int64')
+    parsed['rep'] = pd.to_numeric(parsed['rep'], errors='coerce').astype('Int64')
+    return parsed
+
+
+def harness_paths(data_frame: pd.DataFrame) -> pd.Series:
+    """Path of every row of a create_dataframe table, whose path is split in columns '0', '1', ...
+    With -sd the paths have different depths, the columns past the end of a shorter path are empty"""
+    path_columns = [column for column in data_frame.columns if str(column).isdigit()]
+    return data_frame[path_columns].apply(lambda components: '/'.join(components.dropna().astype(str)), axis=1)
+
+
+def from_harness(data_frame: pd.DataFrame, source: str) -> pd.DataFrame:
+    """Converts the data frame of asr_performance.calculation / create_dataframe (path split in
+    columns '0', '1', ..., errors in %, W.A.R. as a fraction) into rows of the store"""
+    data_frame = data_frame.dropna(subset=['W.A.R. (%)'])
+    paths = harness_paths(data_frame)
+    rows = pd.DataFrame({'source': source, 'path': paths, 'file': paths.str.split('/').str[-1]})
+    rows = pd.concat([rows, parse_file_names(rows['file'])], axis=1)
+    rows['war'] = data_frame['W.A.R. (%)'].astype(float) * 100
+    rows['deletion'] = data_frame['Deletion error (%)'].astype(float)
+    rows['insertion'] = data_frame['Insertion error (%)'].astype(float)
+    rows['substitution'] = data_frame['Substitution error (%)'].astype(float)
+    rows['transcript'] = data_frame['Transcript'].map(lambda words: ' '.join(words) if isinstance(words, list) else str(words))
+    rows['reference'] = data_frame['Reference Text'].astype(str)
+    rows['run'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    return rows[columns]
+
+
+def connect(store_path=default_store):
+    connection = sqlite3.connect(store_path)
+    connection.execute(f'''CREATE TABLE IF NOT EXISTS {table_name} (
+        source TEXT, path TEXT, file TEXT, utterance TEXT, variant TEXT, db INTEGER, rep INTEGER,
+        war REAL, deletion REAL, insertion REAL, substitution REAL, transcript TEXT, reference TEXT, run TEXT)''')
+    connection.execute(f'CREATE INDEX IF NOT EXISTS {table_name}_keys ON {table_name} (source, utterance, db, rep, variant)')
+    return connection
+
+
+def append_results(rows: pd.DataFrame, store_path=default_store, replace_source=True) -> None:
+    """Appends rows (from from_harness) to the store. With replace_source, the rows already stored
+    for the same sources are deleted first, so scoring a set of files again does not duplicate them"""
+    with connect(store_path) as connection:
+        if replace_source:
+            sources = rows['source'].unique().tolist()
+            connection.execute(f'DELETE FROM {table_name} WHERE source IN ({",".join("?" * len(sources))})', sources)
+        rows[columns].to_sql(table_name, connection, if_exists='append', index=False)
+    connection.close()
+
+
+def read_results(store_path=default_store, sources=None) -> pd.DataFrame:
+    query = f'SELECT * FROM {table_name}'
+    params = []
+    if sources:
+        query += f' WHERE source IN ({",".join("?" * len(sources))})'
+        params = list(sources)
+    with connect(store_path) as connection:
+        results = pd.read_sql_query(query, connection, params=params)
+    connection.close()
+    return results
+
+
+def import_excel(excel_paths, store_path=default_store) -> int:
+    """Adds *_output.xlsx files written by older versions of tabulate_audiofiles.py to the store,
+    the source of each one is its name without _output.xlsx"""
+    nb_rows = 0
+    for excel_path in excel_paths:
+        source = os.path.basename(excel_path).replace('_output.xlsx', '')
+        data_frame = pd.read_excel(excel_path)
+        # the transcripts were saved as the text of a python list
+        data_frame['Transcript'] = data_frame['Transcript'].astype(str).str.findall(r"'([^']*)'")
+        rows = from_harness(data_frame, source)
+        append_results(rows, store_path)
+        nb_rows += len(rows)
+    return nb_rows
+
+
+def war_pairs(results: pd.DataFrame, mixed='mixed', return_unpaired=False):
+    """Joins the W.A.R. of every processed variant with the W.A.R. of the mixed file of the same
+    (source, utterance, dB level, repetition). Returns one row per processed file with the columns
+    source, utterance, db, rep, variant, file (of the mixed file), mixed_war, processed_war, improvement.
+    Files without a counterpart are left out. A file scored by several runs only counts with its latest run.
+    With return_unpaired, also returns the left out rows: processed files without a mixed file
+    (mixed_war is NaN) and mixed files without any processed variant (variant is NaN)"""
+    keys = ['source', 'utterance', 'db', 'rep']
+    results = results.dropna(subset=['utterance'])
+    if 'run' in results.columns:
+        results = results.sort_values('run', kind='stable')
+    results = results.drop_duplicates(keys + ['variant'], keep='last')
+    mixed_rows = results.loc[results['variant'] == mixed, keys + ['file', 'war']].rename(columns={'war': 'mixed_war'})
+    processed_rows = results.loc[results['variant'] != mixed, keys + ['variant', 'war']].rename(columns={'war': 'processed_war'})
+    merged = processed_rows.merge(mixed_rows, on=keys, how='outer', validate='many_to_one', indicator=True)
+    merged['improvement'] = merged['processed_war'] - merged['mixed_war']
+    paired = merged['_merge'] == 'both'
+    output_columns = keys + ['variant', 'file', 'mixed_war', 'processed_war', 'improvement']
+    pairs = merged.loc[paired, output_columns].reset_index(drop=True)
+    if return_unpaired:
+        return pairs, merged.loc[~paired, output_columns].reset_index(drop=True)
+    return pairs
+
+
+def summary_by_db(pairs: pd.DataFrame) -> pd.DataFrame:
+    """Average mixed / processed W.A.R. and improvement per source, variant and dB level"""
+    return (pairs.groupby(['source', 'variant', 'db'])[['mixed_war', 'processed_war', 'improvement']]
+            .mean().reset_index())
+
+
+def tar_war_summary(pairs: pd.DataFrame, threshold=90) -> pd.DataFrame:
+    """Table of bar_graph.py per source and variant: average W.A.R. mixed / processed / difference,
+    TAR(M) = number of mixed files with W.A.R. >= threshold, TAR(P) = number of processed files
+    with W.A.R. >= threshold, TAR(D) = TAR(P) / TAR(M) - 1 in %"""
+    # as in bar_graph.py, files with a negative mixed W.A.R. are outside the bins and not counted
+    high = pairs.assign(high_mixed=pairs['mixed_war'] >= threshold,
+                        high_processed=(pairs['mixed_war'] >= 0) & (pairs['processed_war'] >= threshold))
+    table = high.groupby(['source', 'variant']).agg(**{
+        'WAR(M)': ('mixed_war', 'mean'), 'WAR(P)': ('processed_war', 'mean'),
+        'TAR(M)': ('high_mixed', 'sum'), 'TAR(P)': ('high_processed', 'sum')}).reset_index()
+    table['WAR(M)'] = table['WAR(M)'].round()
+    table['WAR(P)'] = table['WAR(P)'].round()
+    table['WAR(D)'] = table['WAR(P)'] - table['WAR(M)']
+    table['TAR(D)'] = (((table['TAR(P)'] / table['TAR(M)'].where(table['TAR(M)'] > 0)) - 1) * 100).round()
+    return table[['source', 'variant', 'WAR(M)', 'WAR(P)', 'WAR(D)', 'TAR(M)', 'TAR(P)', 'TAR(D)']]
+
+
+def export_excel(tables: dict, output_file: str) -> None:
+    """Writes each data frame of tables to its own sheet"""
+    with pd.ExcelWriter(output_file) as writer:
+        for sheet_name, table in tables.items():
+            table.to_excel(writer, sheet_name=sheet_name, index=False)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Results store of the ASR benchmark.')
+    parser.add_argument('store', type=str, nargs='?', default=default_store, help='SQLite file of the results')
+    parser.add_argument('--import-excel', dest='excel_dir', type=str, help='Directory of *_output.xlsx files to import')
+    parser.add_argument('--summary', action='store_true', help='Print the per dB level and TAR/WAR tables')
+    parser.add_argument('--mixed', type=str, default='mixed', help='Variant name of the unprocessed files')
+    parser.add_argument('--export', type=str, help='Write the results and the tables to this .xlsx file')
+    args = parser.parse_args()
+
+    if args.excel_dir:
+        excel_paths = [os.path.join(args.excel_dir, file) for file in sorted(os.listdir(args.excel_dir))
+                       if file.endswith('_output.xlsx') and not file.startswith('~$')]
+        print(f'Imported {import_excel(excel_paths, args.store)} rows from {len(excel_paths)} files')
+
+    if args.summary or args.export:
+        results = read_results(args.store)
+        pairs = war_pairs(results, args.mixed)
+        tables = {'Per dB': summary_by_db(pairs), 'TAR WAR': tar_war_summary(pairs)}
+        if args.summary:
+            for title, table in tables.items():
+                print(f'\n{title}\n{table.to_string(index=False)}')
+        if args.export:
+            export_excel({'Results': results, 'Pairs': pairs, **tables}, args.export)
+            print(f'Saved {args.export}')
+    return 0
+
+
+if __name__ == "__main__":
+    SystemExit(main())
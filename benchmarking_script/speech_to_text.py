@@ -0,0 +1,96 @@
+# from operator import itemgetter
+# from tqdm import tqdm
+import pydub
+# from command_map import get_ha_command
+from asr_backends import get_backend
+
+
+def normalization(audio: pydub.audio_segment.AudioSegment) -> pydub.audio_segment.AudioSegment:
+    """ Function that normalizes and sets bit depth to 16, in memory
+        Returns transformed audio
+
+    Parameters
+    ----------
+    audio (pydub.audio_segment.AudioSegment): single channel audio
+
+    Returns
+    -------
+    pydub.audio_segment.AudioSegment: normalized audio that has a bit depth of 16
+    """
+    print("Normalizing audio file...")
+    byte_depth = 16 // 8
+    return pydub.audio_segment.effects.normalize(audio).set_sample_width(byte_depth)
+
+
+def read_audio(filename: str, normalize=True) -> pydub.audio_segment.AudioSegment:
+    """ Function that reads a .wav file once and returns the 16 bit audio handed to the ASR backend.
+        With normalize, channel 1 is extracted and normalized; nothing is written to disk
+    """
+    # Import audio file, channels, sample rate and bit depth all come from this single read
+    wav_file = pydub.AudioSegment.from_file(filename, format="wav")
+    if not normalize:
+        return wav_file.set_sample_width(16 // 8)
+
+    print("Normalizing file...")
+    if wav_file.sample_width != 16 // 8:
+        print('Bit depth has to be 16, converting...')
+
+    # Extracting channel 1 data from each audio files if applicable before normalization()
+    if wav_file.channels == 1:
+        audio_seg = wav_file
+    else:
+        audio_seg = wav_file.split_to_mono()[0]
+    return normalization(audio_seg)
+
+
+def get_info(filenames_list, args_api, args_retries, normalize=True):
+    """ Function that extracts information from .wav file + separating trasnscripts per .wav file
+        args_api is a backend name (google, whisper, stub) or an asr_backends.ASRBackend
+    """
+    backend = get_backend(args_api)
+    normalized_files_info = []
+    transcription = []
+    script = []
+    filename = filenames_list[0]
+    audio = read_audio(filename, normalize)
+    normalized_files_info.append(filename)
+    # File information before normalization. This is printed onto the terminal
+
+        # print('File information before normalization:'
+        #       '\n\tFile name:', filename,
+        #       '\n\tChannels:', audio.channels,
+        #       '\n\tSample rate:', audio.frame_rate,
+        #       '\n\tFile duration:', audio.duration_seconds, 'seconds',
+        #       '\n\tBit depth:', audio.sample_width * 8,
+        #       '\n')
+
+    if backend.max_duration is not None and audio.duration_seconds >= backend.max_duration:
+        print(f'audio file is too long, it needs to be less then {backend.max_duration} seconds.')
+    for tries in range(1, args_retries + 1):
+        try:
+            transcriptions = backend.transcribe(audio, filename)
+            transcription.append(transcriptions)
+            # print('Transcribed: ', filename)
+            break
+        except Exception as e:
+            if tries == args_retries:
+                raise e
+            print(f'ASR attempt {tries}/{args_retries}, retrying...')
+
+    # Extracting transcript for each filename
+    for i in transcription:
+        tokens = []
+        for j in i:
+            script_string = j['transcript']
+            token = script_string.split()
+            tokens.extend(x.lower().replace("'s", "") for x in token)
+        script.append(tokens)
+
+    return normalized_files_info, transcription, script
+
+
+# Execution
+def transcribe(list_filenames, api, retries=2, normalize=True):
+    normalized_files_info, transcription, script = get_info(
+        list_filenames, api, retries, normalize)
+    return normalized_files_info, transcription, script
@@ -0,0 +1,53 @@
+import hashlib
+import sqlite3
+'''
+Cache of ASR transcripts for the incremental mode of tabulate_audiofiles.py (-i).
+A transcript is stored under (hash of the .wav content, backend, model, normalization flag), so a
+file is only sent to the ASR again when its audio, the backend or its settings change; renaming or
+moving a file keeps its transcript. W.A.R. and errors are not cached: they are recomputed from the
+transcript against the current reference .txt, which takes milliseconds, and stay correct when a
+reference is edited.
+Every transcript is saved as soon as it is received, an interrupted run resumes where it stopped.
+'''
+
+default_cache = 'transcripts.sqlite'
+table_name = 'transcripts'
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """sha1 of the content of the file"""
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def connect(cache_path=default_cache):
+    connection = sqlite3.connect(cache_path)
+    connection.execute(f'''CREATE TABLE IF NOT EXISTS {table_name} (
+        audio_hash TEXT, backend TEXT, model TEXT, normalize INTEGER, tokens TEXT, path TEXT,
+        PRIMARY KEY (audio_hash, backend, model, normalize))''')
+    return connection
+
+
+def lookup(hashes, backend, normalize, cache_path=default_cache) -> dict:
+    """Returns {audio hash: transcript tokens} for the hashes already transcribed with these settings"""
+    found = {}
+    with connect(cache_path) as connection:
+        rows = connection.execute(f'SELECT audio_hash, tokens FROM {table_name} WHERE backend = ? AND model = ? AND normalize = ?',
+                                  (backend.name, backend.model_id, int(normalize))).fetchall()
+    connection.close()
+    wanted = set(hashes)
+    for audio_hash, tokens in rows:
+        if audio_hash in wanted:
+            found[audio_hash] = tokens.split()
+    return found
+
+
+def save(audio_hash, tokens, backend, normalize, path, cache_path=default_cache) -> None:
+    """Stores the tokens of one transcript, replacing an older one with the same key"""
+    with connect(cache_path) as connection:
+        connection.execute(f'INSERT OR REPLACE INTO {table_name} VALUES (?, ?, ?, ?, ?, ?)',
+                           (audio_hash, backend.name, backend.model_id, int(normalize), ' '.join(tokens), path))
+    connection.close()
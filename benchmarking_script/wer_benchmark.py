@@ -0,0 +1,108 @@
+import argparse
+import os
+import time
+import jiwer
+import numpy as np
+from wer_scoring import Reference, default_transform, score_many
+
+'''
+Checks that wer_scoring.score_many gives the same WordOutput as jiwer.process_words (error rates,
+hit / substitution / deletion / insertion counts, word lists, alignment chunks and the text of
+jiwer.visualize_alignment), on a fixture of hypotheses made from the reference: every kind of
+edit, empty and whitespace-only transcripts, punctuation, case and newlines, words missing from
+the reference, and random mixes of those. Then times both on the same hypotheses.
+
+To run, with the sample reference of the harness:
+python wer_benchmark.py --reference reference-cat.txt --nb-hypotheses 2000
+'''
+
+fields = ['wer', 'mer', 'wil', 'wip', 'hits', 'substitutions', 'deletions', 'insertions',
+          'references', 'hypotheses', 'alignments']
+unknown_words = ['zebra', 'quickly', 'seven', 'the', 'a']
+
+
+def make_hypotheses(reference_text, nb_hypotheses=200, seed=0):
+    """Edge cases, then random word deletions, substitutions, insertions and swaps of the reference"""
+    words = reference_text.split()
+    hypotheses = [reference_text, '', '   ', '\n', reference_text.upper(), reference_text + '\n',
+                  reference_text.replace(' ', '  '), reference_text.replace('.', ''), ' '.join(words[::-1]),
+                  ' '.join(words[:1]), ' '.join(words[1:]), ' '.join(words + words), ' '.join(unknown_words),
+                  "it's the cat's, isn't it?"]
+    rng = np.random.default_rng(seed)
+    while len(hypotheses) < nb_hypotheses:
+        hypothesis = list(words)
+        for _ in range(rng.integers(1, 8)):
+            position = int(rng.integers(0, len(hypothesis) + 1))
+            edit = rng.integers(0, 4)
+            if edit == 0 and hypothesis:
+                del hypothesis[min(position, len(hypothesis) - 1)]
+            elif edit == 1 and hypothesis:
+                hypothesis[min(position, len(hypothesis) - 1)] = str(rng.choice(unknown_words + words))
+            elif edit == 2:
+                hypothesis.insert(position, str(rng.choice(unknown_words + words)))
+            elif len(hypothesis) > 1:
+                i = min(position, len(hypothesis) - 2)
+                hypothesis[i], hypothesis[i + 1] = hypothesis[i + 1], hypothesis[i]
+        hypotheses.append(' '.join(hypothesis))
+    return hypotheses[:nb_hypotheses]
+
+
+def jiwer_many(reference_text, hypotheses):
+    """jiwer.process_words on every hypothesis, as asr_performance.calculation used to score them"""
+    return [jiwer.process_words(reference_text, hypothesis, reference_transform=default_transform,
+                                hypothesis_transform=default_transform) for hypothesis in hypotheses]
+
+
+def check_equivalence(reference_text, hypotheses, workers=1):
+    """Raises AssertionError if score_many does not match jiwer.process_words on a hypothesis"""
+    expected = jiwer_many(reference_text, hypotheses)
+    word_outputs = score_many(Reference(reference_text), hypotheses, workers=workers, chunk_size=64)
+    assert len(word_outputs) == len(expected)
+    for hypothesis, word_output, reference_output in zip(hypotheses, word_outputs, expected):
+        for field in fields:
+            assert getattr(word_output, field) == getattr(reference_output, field), \
+                f'{field} differs for {hypothesis!r}: {getattr(word_output, field)} != {getattr(reference_output, field)}'
+        assert jiwer.visualize_alignment(word_output) == jiwer.visualize_alignment(reference_output), hypothesis
+
+
+def benchmark(reference_text, hypotheses, repeat=3):
+    """Returns the best of `repeat` timings (s) of jiwer and score_many on the hypotheses"""
+    def best(function):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    return {
+        'jiwer.process_words': best(lambda: jiwer_many(reference_text, hypotheses)),
+        'score_many': best(lambda: score_many(Reference(reference_text), hypotheses)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check and time wer_scoring.score_many against jiwer.process_words.')
+    parser.add_argument('--reference', type=str, default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'reference-cat.txt'),
+                        help='Reference .txt the hypotheses are made from')
+    parser.add_argument('--nb-hypotheses', dest='nb_hypotheses', type=int, default=500, help='Number of hypotheses')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the random edits')
+    parser.add_argument('--workers', type=int, default=2, help='Processes of the second check, 1 to skip it')
+    args = parser.parse_args()
+
+    # read like asr_performance.parse_reference_txt, the trailing newline is kept
+    with open(args.reference, 'r', encoding='utf8') as file:
+        reference_text = file.read().lower().replace("'s", "")
+    hypotheses = make_hypotheses(reference_text, args.nb_hypotheses, args.seed)
+
+    check_equivalence(reference_text, hypotheses)
+    if args.workers > 1:
+        check_equivalence(reference_text, hypotheses, workers=args.workers)
+    print(f'score_many matches jiwer.process_words on {len(hypotheses)} hypotheses')
+
+    for key, value in benchmark(reference_text, hypotheses).items():
+        print(f'{key}: {value:.3f} s')
+
+
+if __name__ == "__main__":
+    main()
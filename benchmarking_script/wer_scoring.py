@@ -0,0 +1,117 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import jiwer
+import rapidfuzz
+from jiwer.process import AlignmentChunk, WordOutput
+'''
+Word error rate and alignment of many transcriptions against one reference, for asr_performance.py.
+jiwer.process_words applies the transform to the reference, maps every word to an integer and
+aligns, again for every transcription. Here a Reference is transformed and mapped once per .txt,
+and each transcription only costs its own transform and the Levenshtein alignment (rapidfuzz,
+the native engine jiwer uses), so results are exactly those of jiwer.process_words: the same
+jiwer.process.WordOutput, which works with jiwer.visualize_alignment.
+Large batches can be spread over processes (score_many(..., workers=4)).
+AlignmentWriter writes alignments.txt through one buffered file, shared by all the threads.
+
+e.g.
+reference = Reference(reference_text)
+word_outputs = score_many(reference, [' '.join(tokens) for tokens in transcriptions])
+'''
+
+default_transform = jiwer.Compose([
+    jiwer.RemoveMultipleSpaces(),
+    jiwer.RemovePunctuation(),
+    jiwer.ReduceToListOfListOfWords()
+])
+
+
+class Reference:
+    """A reference text transformed and mapped to integers once, to be scored against many hypotheses"""
+
+    def __init__(self, text: str, transform=default_transform):
+        self.text = text
+        self.transform = transform
+        self.words = transform([text])[0]
+        if len(self.words) == 0:
+            raise ValueError('The reference is empty after applying the transform')
+        self.word_ids = {}
+        self.ints = [self.word_ids.setdefault(word, len(self.word_ids)) for word in self.words]
+
+    def to_ints(self, words):
+        # words that are not in the reference get new ids local to this hypothesis, only equality matters
+        new_ids = {}
+        return [self.word_ids[word] if word in self.word_ids else new_ids.setdefault(word, len(self.word_ids) + len(new_ids))
+                for word in words]
+
+    def score(self, hypothesis: str) -> WordOutput:
+        """Same output as jiwer.process_words(self.text, hypothesis, self.transform, self.transform)"""
+        return self.score_words(self.transform([hypothesis])[0])
+
+    def score_words(self, hypothesis_words) -> WordOutput:
+        """score of a hypothesis already transformed into a list of words"""
+        opcodes = rapidfuzz.distance.Levenshtein.opcodes(self.ints, self.to_ints(hypothesis_words))
+
+        hits = subs = dels = ins = 0
+        chunks = []
+        for tag, i1, i2, j1, j2 in opcodes:
+            chunks.append(AlignmentChunk(type=tag, ref_start_idx=i1, ref_end_idx=i2, hyp_start_idx=j1, hyp_end_idx=j2))
+            if tag == 'equal':
+                hits += i2 - i1
+            elif tag == 'replace':
+                subs += i2 - i1
+            elif tag == 'delete':
+                dels += i2 - i1
+            elif tag == 'insert':
+                ins += j2 - j1
+
+        wer = float(subs + dels + ins) / float(hits + subs + dels)
+        mer = float(subs + dels + ins) / float(hits + subs + dels + ins)
+        wip = (float(hits) / len(self.words)) * (float(hits) / len(hypothesis_words)) if hypothesis_words else 0
+        return WordOutput(references=[self.words], hypotheses=[hypothesis_words], alignments=[chunks],
+                          wer=wer, mer=mer, wil=1 - wip, wip=wip,
+                          hits=hits, substitutions=subs, insertions=ins, deletions=dels)
+
+
+def _score_chunk(reference, hypotheses):
+    if not hypotheses:
+        return []
+    # one transform call for the whole chunk
+    return [reference.score_words(words) for words in reference.transform(hypotheses)]
+
+
+def score_many(reference, hypotheses, workers=1, chunk_size=256) -> list:
+    """WordOutput of every hypothesis (str) against reference (a Reference or a str), in order.
+    With workers > 1, chunks of chunk_size hypotheses are scored in a process pool"""
+    if not isinstance(reference, Reference):
+        reference = Reference(reference)
+    hypotheses = list(hypotheses)
+    if workers <= 1 or len(hypotheses) <= chunk_size:
+        return _score_chunk(reference, hypotheses)
+    chunks = [hypotheses[start:start + chunk_size] for start in range(0, len(hypotheses), chunk_size)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(_score_chunk, [reference] * len(chunks), chunks)
+        return [word_output for chunk in results for word_output in chunk]
+
+
+class AlignmentWriter:
+    """Buffered writer of alignments.txt, one open file for a whole run instead of one append per
+    file; write can be called from several threads"""
+
+    def __init__(self, path='alignments.txt', mode='w', buffering=1 << 16):
+        self.file = open(path, mode, buffering=buffering)
+        self.lock = threading.Lock()
+
+    def write(self, files_info, word_outputs):
+        text = ''.join(f'{files_info[idx]=}\n{jiwer.visualize_alignment(word_output)}\n{"-"*20}\n'
+                       for idx, word_output in enumerate(word_outputs))
+        with self.lock:
+            self.file.write(text)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,47 @@
+"""
+Here is a link to the README
+https://github.com/openai/whisper/blob/main/README.md
+"""
+import whisper
+import math
+
+_models = {}
+
+
+def load_whisper(model_name="base"):
+    """Returns the Whisper model, loading it only the first time in this process"""
+    if model_name not in _models:
+        _models[model_name] = whisper.load_model(model_name)
+    return _models[model_name]
+
+
+def transcribeWhisper(input_file:str, model=None, audio=None):
+    """audio, if given, is the float32 mono 16 kHz signal of input_file already in memory"""
+    print("Input File:", input_file)
+
+    # the model is loaded once and shared by every call of this process
+    model = model or load_whisper()
+
+    # load audio and pad/trim it to fit 30 seconds
+    if audio is None:
+        audio = whisper.load_audio(input_file)
+    audio = whisper.pad_or_trim(audio)
+
+    # make log-Mel spectrogram and move to the same device as the model
+    mel = whisper.log_mel_spectrogram(audio).to(model.device)
+
+    # decode the audio
+    options = whisper.DecodingOptions(language= 'en', fp16=False)
+    result = whisper.decode(model, mel, options)
+
+    # This is how they say to caluclate the confidence
+    confidence = math.exp(result.avg_logprob)
+
+    # left these two statments for debugging
+    # print("-Confidence:", confidence)
+    # print("-Transcript:", result.text)
+
+    return [{
+        "transcript": result.text,
+        "confidence": confidence,
+        }]
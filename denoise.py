@@ -0,0 +1,409 @@
+# Shared helpers for the U-Net speech denoiser.
+# These are the functions that every AUG_* / *_Prediction notebook redefines in
+# its own cells; keeping them here lets scripts and notebooks import one copy.
+import os
+import librosa
+import numpy as np
+import soundfile as sf
+from audio_loader import load_many
+from profiling import timed
+
+# Required variables for Audio
+sample_rate = 8000
+min_duration = 1.0
+frame_length = 8064
+hop_length_frame = 8064
+ola_hop_length = 4032  # hop of the overlap-add inference, half a frame is crossfaded
+hop_length_frame_noise = 5000
+nb_samples = 500
+n_fft = 255
+hop_length_fft = 63
+dim_square_spec = int(n_fft / 2) + 1
+
+# Best model downloaded with gdown in the prediction notebooks
+model_json_path = 'Best_json_Unet.json'
+model_weights_path = 'Best_weight_Unet.h5'
+
+
+def audio_to_audio_frame_stack(sound_data, frame_length, hop_length_frame, copy=True):
+    """This function take an audio and split into several frame
+       in a numpy matrix of size (nb_frame,frame_length)
+       With copy=False the frames are a read-only strided view on sound_data, no sample is copied
+       even when hop_length_frame < frame_length"""
+
+    if not copy:
+        frames = np.lib.stride_tricks.sliding_window_view(sound_data, frame_length)
+        return frames[::hop_length_frame]
+
+    sequence_sample_length = sound_data.shape[0]
+    # Creating several audio frames using sliding windows
+    sound_data_list = [sound_data[start:start + frame_length] for start in range(
+        0, sequence_sample_length - frame_length + 1, hop_length_frame)]  # get sliding windows
+    # Combining all the frames to single matrix
+    sound_data_array = np.vstack(sound_data_list)
+    return sound_data_array
+
+
+class FrameStack:
+    """Frames of several audios kept as strided views on the decoded audios.
+    Indexes like the (nb_frame,frame_length) matrix np.vstack would build, but a frame is only
+    copied when it is gathered: frames[i] is a view, frames[list_of_i] a new matrix."""
+
+    def __init__(self, list_frames):
+        self.list_frames = [frames for frames in list_frames if len(frames)]
+        self.offsets = np.cumsum([0] + [len(frames) for frames in self.list_frames])
+
+    @property
+    def shape(self):
+        frame_length = self.list_frames[0].shape[1] if self.list_frames else 0
+        return (int(self.offsets[-1]), frame_length)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def _locate(self, index):
+        file_index = np.searchsorted(self.offsets, index, side='right') - 1
+        return file_index, index - self.offsets[file_index]
+
+    def __getitem__(self, index):
+        if np.ndim(index) == 0:
+            index = int(index)
+            if index < 0:
+                index += len(self)
+            if not 0 <= index < len(self):
+                raise IndexError(f'frame {index} out of range for {len(self)} frames')
+            file_index, frame_index = self._locate(index)
+            return self.list_frames[file_index][frame_index]
+        return np.stack([self[i] for i in np.asarray(index).reshape(-1)])
+
+    def to_numpy(self):
+        """Copies every frame into one (nb_frame,frame_length) matrix"""
+        return np.vstack(self.list_frames)
+
+
+def audio_files_to_numpy(audio_dir, list_audio_files, sample_rate, frame_length, hop_length_frame, min_duration,
+                         copy=True, cache_dir=None, workers=1):
+    """This function take audio files of a directory and merge them
+    in a numpy matrix of size (nb_frame,frame_length) for a sliding window of size hop_length_frame
+    With copy=False a FrameStack of strided views is returned instead of the merged matrix.
+    Files are decoded by `workers` processes (None for all cores) and, when cache_dir is set
+    (e.g. audio_loader.default_cache_dir), the resampled audio is cached there across runs"""
+
+    paths = [os.path.join(audio_dir, file) for file in list_audio_files]
+    list_y = load_many(paths, sample_rate, cache_dir=cache_dir, workers=workers)
+
+    list_sound_array = []
+
+    for path, y in zip(paths, list_y):
+        # Getting duration of audio file
+        total_duration = librosa.get_duration(y=y, sr=sample_rate)
+
+        # Check if the duration is atleast the minimum duration
+        if (total_duration >= min_duration and len(y) >= frame_length):
+            list_sound_array.append(audio_to_audio_frame_stack(
+                y, frame_length, hop_length_frame, copy=copy))
+        else:
+            print(
+                f"The following file {path} is below the min duration")
+
+    if not copy:
+        return FrameStack(list_sound_array)
+    return np.vstack(list_sound_array)
+
+
+def audio_to_magnitude_db_and_phase(n_fft, hop_length_fft, audio):
+    """This function takes an audio and convert into spectrogram,
+       it returns the magnitude in dB and the phase"""
+
+    stftaudio = librosa.stft(audio, n_fft=n_fft, hop_length=hop_length_fft)
+    stftaudio_magnitude, stftaudio_phase = librosa.magphase(stftaudio)
+
+    stftaudio_magnitude_db = librosa.amplitude_to_db(
+        stftaudio_magnitude, ref=np.max)
+
+    return stftaudio_magnitude_db, stftaudio_phase
+
+
+def batch_audio_to_magnitude_db_and_phase(numpy_audio, n_fft, hop_length_fft, dtype=np.float64,
+                                          amin=1e-5, top_db=80.0):
+    """This function takes a numpy audio of size (nb_frame,frame_length) and returns the magnitude
+    in dB and the phase of every frame with one stft call. It gives the same result as calling
+    audio_to_magnitude_db_and_phase on each frame, the dB reference is the max of each frame.
+    dtype=np.float32 gives float32 magnitudes and complex64 phases"""
+
+    numpy_audio = np.asarray(numpy_audio, dtype=dtype)
+    stftaudio = librosa.stft(numpy_audio, n_fft=n_fft, hop_length=hop_length_fft)
+
+    # magphase without its extra copies: the phase is computed in place of the stft
+    magnitude = np.abs(stftaudio)
+    zeros = magnitude == 0
+    np.divide(stftaudio, magnitude, out=stftaudio, where=~zeros)
+    stftaudio[zeros] = 1  # same convention as librosa.magphase for empty bins
+
+    # amplitude_to_db(ref=np.max) for every frame, in place of the magnitude
+    ref = magnitude.max(axis=(-2, -1), keepdims=True)
+    np.maximum(magnitude, amin, out=magnitude)
+    np.log10(magnitude, out=magnitude)
+    magnitude *= 20.0
+    magnitude -= 20.0 * np.log10(np.maximum(ref, amin))
+    np.maximum(magnitude, magnitude.max(axis=(-2, -1), keepdims=True) - top_db, out=magnitude)
+
+    return magnitude, stftaudio
+
+
+def numpy_audio_to_matrix_spectrogram(numpy_audio, dim_square_spec, n_fft, hop_length_fft, dtype=np.float64):
+    """This function takes as input a numpy audi of size (nb_frame,frame_length), and return
+    a numpy containing the matrix spectrogram for amplitude in dB and phase. It will have the size
+    (nb_frame,dim_square_spec,dim_square_spec)"""
+
+    # we extract the magnitude vectors from the 256-point STFT vectors and
+    # take the first 129-point by removing the symmetric half.
+
+    m_mag_db, m_phase = batch_audio_to_magnitude_db_and_phase(numpy_audio, n_fft, hop_length_fft, dtype=dtype)
+    return m_mag_db[:, :dim_square_spec, :dim_square_spec], m_phase[:, :dim_square_spec, :dim_square_spec]
+
+
+def magnitude_db_and_phase_to_audio(frame_length, hop_length_fft, stftaudio_magnitude_db, stftaudio_phase):
+    """This functions reverts a spectrogram to an audio.
+    Works on one spectrogram or on a stack of spectrograms of size (nb_frame,freq,time)"""
+
+    stftaudio_magnitude_rev = librosa.db_to_amplitude(stftaudio_magnitude_db, ref=1.0)
+
+    # taking magnitude and phase of audio
+    audio_reverse_stft = stftaudio_magnitude_rev * stftaudio_phase
+    audio_reconstruct = librosa.core.istft(audio_reverse_stft, hop_length=hop_length_fft, length=frame_length)
+
+    return audio_reconstruct
+
+
+def matrix_spectrogram_to_numpy_audio(m_mag_db, m_phase, frame_length, hop_length_fft):
+    """This functions reverts the matrix spectrograms to numpy audio"""
+
+    # istft handles the stack of spectrograms in one call, the output follows the input dtype
+    return magnitude_db_and_phase_to_audio(frame_length, hop_length_fft, m_mag_db, m_phase)
+
+
+def scaled_in(matrix_spec):
+    "global scaling apply to noisy voice spectrograms (scale between -1 and 1)"
+    matrix_spec = (matrix_spec + 46)/50
+    return matrix_spec
+
+
+def scaled_ou(matrix_spec):
+    "global scaling apply to noise models spectrograms (scale between -1 and 1)"
+    matrix_spec = (matrix_spec - 6)/82
+    return matrix_spec
+
+
+def inv_scaled_ou(matrix_spec):
+    "inverse global scaling apply to noise models spectrograms"
+    matrix_spec = matrix_spec * 82 + 6
+    return matrix_spec
+
+
+def load_model(json_path=model_json_path, weights_path=model_weights_path):
+    """This function rebuilds the U-Net from its json description and loads the trained weights"""
+    from tensorflow.keras.models import model_from_json
+
+    # load json and create model
+    with open(json_path, 'r') as json_file:
+        loaded_model_json = json_file.read()
+    loaded_model = model_from_json(loaded_model_json)
+    # load weights into new model
+    loaded_model.load_weights(weights_path)
+    print("Loaded model from disk")
+    return loaded_model
+
+
+def frames_to_network_input(audio):
+    """This function takes a matrix of audio frames of size (nb_frame,frame_length) and returns
+    the magnitude in dB, the phase and the scaled network input of size (nb_frame,128,128,1)"""
+
+    # Create Amplitude and phase of the sounds
+    m_amp_db_audio, m_pha_audio = numpy_audio_to_matrix_spectrogram(
+        audio, dim_square_spec, n_fft, hop_length_fft)
+
+    #global scaling to have distribution -1/1
+    X_in = scaled_in(m_amp_db_audio)
+    #Reshape for prediction
+    X_in = X_in.reshape(X_in.shape[0], X_in.shape[1], X_in.shape[2], 1)
+    return m_amp_db_audio, m_pha_audio, X_in
+
+
+def network_output_to_frames(m_amp_db_audio, m_pha_audio, X_pred, frame_length):
+    """This function removes the predicted noise model from the noisy spectrograms and
+    returns the denoised audio frames of size (nb_frame,frame_length)"""
+
+    #Rescale back the noise model
+    inv_sca_X_pred = inv_scaled_ou(X_pred)
+    #Remove noise model from noisy speech
+    X_denoise = m_amp_db_audio - inv_sca_X_pred[:, :, :, 0]
+    #Reconstruct audio from denoised spectrogram and phase
+    return matrix_spectrogram_to_numpy_audio(X_denoise, m_pha_audio, frame_length, hop_length_fft)
+
+
+def denoise_frames(loaded_model, audio):
+    """This function takes a matrix of audio frames of size (nb_frame,frame_length),
+    removes the noise model predicted by the network and returns the denoised frames.
+    loaded_model can be a keras model or a DenoiseSession"""
+
+    # timed stages are only recorded when profiling is enabled (see profiling.py)
+    with timed('stft', frames=len(audio)):
+        m_amp_db_audio, m_pha_audio, X_in = frames_to_network_input(audio)
+    #Prediction using loaded network
+    with timed('predict', frames=len(audio)):
+        X_pred = loaded_model.predict(X_in, verbose=0)
+    with timed('istft', frames=len(audio)):
+        return network_output_to_frames(m_amp_db_audio, m_pha_audio, X_pred, audio.shape[1])
+
+
+def crossfade_ramp(overlap):
+    """Raised-cosine fade-in of overlap samples, its reverse is the matching fade-out: they sum to 1"""
+    return (np.sin(np.pi * (np.arange(overlap) + 0.5) / (2 * overlap)) ** 2).astype(np.float32)
+
+
+def crossfade_window(frame_length, hop):
+    """Window of the overlap-add: flat, with raised-cosine ramps over the frame_length - hop samples
+    shared by two consecutive frames, so the fade-out of a frame and the fade-in of the next sum to 1"""
+    if not frame_length // 2 <= hop <= frame_length:
+        raise ValueError(f'hop must be in [{frame_length // 2}, {frame_length}], got {hop}')
+    overlap = frame_length - hop
+    fade_in = crossfade_ramp(overlap)
+    window = np.ones(frame_length, dtype=np.float32)
+    window[:overlap] = fade_in
+    window[frame_length - overlap:] = fade_in[::-1]
+    return window
+
+
+def padded_frame_stack(audio, frame_length, hop):
+    """This function pads audio with zeros and splits it into frames every hop samples so that every
+    sample of audio is covered, including the tail shorter than a frame. The first and last
+    frame_length - hop samples of the padded audio are the fades of the crossfade window, the audio
+    starts after them. Returns the (nb_frame,frame_length) frames and the number of leading zeros"""
+    overlap = frame_length - hop
+    nb_frames = max(1, int(np.ceil((len(audio) + 2 * overlap - frame_length) / hop)) + 1)
+    padded = np.zeros((nb_frames - 1) * hop + frame_length, dtype=np.float32)
+    padded[overlap:overlap + len(audio)] = audio
+    return audio_to_audio_frame_stack(padded, frame_length, hop), overlap
+
+
+def overlap_add(frames, hop, length, offset=0):
+    """This function crossfades consecutive frames, taken every hop samples, into one audio and returns
+    its length samples after offset. Every sample is divided by the sum of the windows covering it"""
+    nb_frames, frame_length = frames.shape
+    window = crossfade_window(frame_length, hop)
+    audio = np.zeros((nb_frames - 1) * hop + frame_length, dtype=np.float32)
+    weight = np.zeros_like(audio)
+    for i, frame in enumerate(frames):
+        audio[i * hop:i * hop + frame_length] += window * frame
+        weight[i * hop:i * hop + frame_length] += window
+    return audio[offset:offset + length] / weight[offset:offset + length]
+
+
+class DenoiseSession:
+    """Keeps one loaded U-Net in memory so that back-to-back requests only pay for inference.
+    prediction() used to rebuild the model from json and reload the weights on every call."""
+
+    def __init__(self, json_path=model_json_path, weights_path=model_weights_path,
+                 warmup=True, compile=True, output_gain=10):
+        import tensorflow as tf
+
+        self.model = load_model(json_path, weights_path)
+        self.output_gain = output_gain  # prediction() scales its output by 10
+        if compile:
+            # A traced graph skips the per-call setup that model.predict does
+            self._forward = tf.function(
+                lambda x: self.model(x, training=False),
+                input_signature=[tf.TensorSpec([None, dim_square_spec, dim_square_spec, 1], tf.float32)])
+        else:
+            self._forward = None
+        if warmup:
+            # First call traces the graph and allocates the buffers
+            self.predict(np.zeros((1, dim_square_spec, dim_square_spec, 1), dtype=np.float32))
+
+    def predict(self, X_in, verbose=0):
+        """Same contract as keras Model.predict, so a session can be used wherever a model is"""
+        if self._forward is None:
+            return self.model.predict(X_in, verbose=verbose)
+        return self._forward(np.asarray(X_in, dtype=np.float32)).numpy()
+
+    def denoise(self, audio, hop=None):
+        """This function takes a 1D numpy audio at sample_rate and returns the denoised audio"""
+        return self.denoise_many([audio], hop)[0]
+
+    def denoise_many(self, list_audio, hop=None):
+        """This function denoises several 1D numpy audios with a single network call
+        and returns the denoised audios in the same order.
+        With hop=None the audios are cut into back-to-back frames and the tail shorter than a frame
+        is dropped, as prediction() does. With a hop (ola_hop_length, between frame_length / 2 and
+        frame_length) frames are taken every hop samples on the zero-padded audio and crossfaded
+        back by overlap_add: every output has exactly the length of its input"""
+        # checked before any framing, not after the network call in overlap_add
+        if hop is not None and not frame_length // 2 <= hop <= frame_length:
+            raise ValueError(f'hop must be in [{frame_length // 2}, {frame_length}], got {hop}')
+        if len(list_audio) == 0:
+            return []
+        list_frames = []
+        offset = 0
+        for audio in list_audio:
+            if hop is not None:
+                frames, offset = padded_frame_stack(audio, frame_length, hop)
+                list_frames.append(frames)
+                continue
+            if len(audio) < frame_length:
+                raise ValueError(f'audio has {len(audio)} samples, at least {frame_length} are needed')
+            list_frames.append(audio_to_audio_frame_stack(audio, frame_length, hop_length_frame))
+
+        denoised = denoise_frames(self, np.vstack(list_frames)) * self.output_gain
+
+        list_denoised = []
+        start = 0
+        for audio, frames in zip(list_audio, list_frames):
+            if hop is not None:
+                list_denoised.append(overlap_add(denoised[start:start + len(frames)], hop, len(audio), offset))
+            else:
+                list_denoised.append(denoised[start:start + len(frames)].reshape(-1))
+            start += len(frames)
+        return list_denoised
+
+
+_sessions = {}
+
+
+def get_session(json_path=model_json_path, weights_path=model_weights_path):
+    """This function returns the DenoiseSession for these model files, loading it on first use"""
+    key = (os.path.abspath(json_path), os.path.abspath(weights_path))
+    if key not in _sessions:
+        _sessions[key] = DenoiseSession(json_path, weights_path)
+    return _sessions[key]
+
+
+def prediction(weights_path, audio_dir_prediction, dir_save_prediction, audio_input_prediction,
+               audio_output_prediction, hop=None):
+    """ This function takes as input pretrained weights, noisy voice sound to denoise, predict
+    the denoise sound and save it to disk.
+    With a hop (e.g. ola_hop_length) the files are denoised by overlap-add, see DenoiseSession.denoise_many:
+    the output keeps every sample of the inputs, no silence padding is needed to save the last second.
+    """
+
+    # The model is only loaded on the first call, automate_multifiles calls this many times
+    session = get_session(os.path.join(weights_path, model_json_path),
+                          os.path.join(weights_path, model_weights_path))
+
+    if hop is not None:
+        list_audio = load_many([os.path.join(audio_dir_prediction, file) for file in audio_input_prediction],
+                               sample_rate, cache_dir=None, workers=1)
+        denoise_long = np.concatenate(session.denoise_many(list_audio, hop))
+        sf.write(dir_save_prediction + audio_output_prediction, denoise_long, sample_rate, 'PCM_24')
+        return
+
+    # Extracting noise and voice from folder and convert to numpy
+    audio = audio_files_to_numpy(audio_dir_prediction, audio_input_prediction, sample_rate,
+                                 frame_length, hop_length_frame, min_duration)
+
+    audio_denoise_recons = denoise_frames(session, audio)
+    #Number of frames
+    nb_samples = audio_denoise_recons.shape[0]
+    #Save all frames in one file
+    denoise_long = audio_denoise_recons.reshape(1, nb_samples * frame_length)*session.output_gain
+    sf.write(dir_save_prediction + audio_output_prediction, denoise_long[0, :], sample_rate, 'PCM_24')
@@ -0,0 +1,118 @@
+import argparse
+import os
+import zlib
+import librosa
+import numpy as np
+import soundfile as sf
+from audio_loader import default_cache_dir, load_audio
+
+'''
+Noisy test files for the denoising experiments (add_noise_multifiles in Create_noisy_files and
+automate_multifiles in the AUG_* notebooks).
+The notebooks overlay the noise on each clean file with pydub one dB level and one repetition
+at a time, export every mixture at 16 kHz, read it back with librosa.load(sr=8000) and write it
+again with scipy. Here the clean file and the noise are decoded once, all the
+(dB level, repetition) mixtures of a file are made by one gather + add on strided views, and
+they are resampled to 8 kHz in one batched call. The random offsets come from a generator
+seeded with (seed, file name), so a file always gets the same mixtures whatever the other files.
+
+To write every mixture of a folder at 16 kHz and 8 kHz (names as in automate_multifiles):
+python noisy_mix.py /content/wav_files_toprocess pharrell-williams-happy_16khz.wav -o /content/ --db-levels -16 --reps $(seq 1 30)
+Same levels as add_noise_multifiles:
+python noisy_mix.py /content/wav_files_to_adjust dogs-barking-sound-effect_audio_low.wav --db-levels $(seq 10 -2 -20) --reps 0
+'''
+
+sr_16k = 16000
+sr_8k = 8000
+mixed_16k_name = '{name}_mixed_{db}db_{rep}.wav'
+mixed_8k_name = '{name}_mixed_8k_{db}db_{rep}.wav'
+
+
+def db_to_gain(db):
+    """Amplitude factor of a gain in dB, what pydub's `segment + db` applies"""
+    return 10 ** (np.asarray(db, dtype=np.float32) / 20)
+
+
+def file_rng(seed, name):
+    """Random generator of the mixtures of one file: depends on the seed and the file name only"""
+    return np.random.default_rng([seed, zlib.crc32(name.encode('utf-8'))])
+
+
+def mix_all(clean, noise, db_levels, nb_reps, rng, return_clean=False):
+    """This function returns the mixtures of clean with noise at every dB level, nb_reps times,
+    as a float32 array of size (len(db_levels), nb_reps, clip) with clip = min(len(clean), len(noise)).
+    As in the notebooks, each mixture crops both signals to clip samples at random start points
+    and adds them, the sum saturates like pydub's overlay does on 16 bit samples.
+    With return_clean, the clean crop of every mixture is returned too, as a second array of the same size"""
+    clip = min(len(clean), len(noise))
+    shape = (len(db_levels), nb_reps)
+    start_clean = rng.integers(0, len(clean) - clip + 1, shape)
+    start_noise = rng.integers(0, len(noise) - clip + 1, shape)
+
+    # one (clip,) view per start sample, nothing is copied until the gather below
+    clean_windows = np.lib.stride_tricks.sliding_window_view(clean, clip)
+    noise_windows = np.lib.stride_tricks.sliding_window_view(noise, clip)
+    clean_crops = clean_windows[start_clean]
+    mixed = clean_crops + db_to_gain(db_levels)[:, np.newaxis, np.newaxis] * noise_windows[start_noise]
+    np.clip(mixed, -1, 32767 / 32768, out=mixed)
+    if return_clean:
+        return mixed, clean_crops
+    return mixed
+
+
+def noisy_mixtures(clean_files, noise_file, db_levels, reps, seed=0, pad_seconds=1.0, tail_seconds=1.0,
+                   with_8k=True, cache_dir=default_cache_dir):
+    """Generator of (file name, mixed_16k, mixed_8k) for every file of clean_files.
+    mixed_16k is the (len(db_levels), len(reps), clip) float32 array of mix_all, mixed_8k the same
+    mixtures resampled to 8 kHz (None if with_8k is False), ready for DenoiseSession.denoise_many.
+    pad_seconds of silence are added at the end of the clean files and tail_seconds at the end of the
+    mixtures, like the two one_sec of automate_multifiles (add_noise_multifiles has no tail: tail_seconds=0)"""
+    noise = load_audio(noise_file, sr_16k, cache_dir)
+    pad = np.zeros(int(pad_seconds * sr_16k), dtype=np.float32)
+    tail = int(tail_seconds * sr_16k)
+    for clean_file in clean_files:
+        name = os.path.splitext(os.path.basename(clean_file))[0]
+        clean = np.concatenate([load_audio(clean_file, sr_16k, cache_dir), pad])
+        mixed_16k = mix_all(clean, noise, db_levels, len(reps), file_rng(seed, name))
+        if tail:
+            mixed_16k = np.pad(mixed_16k, ((0, 0), (0, 0), (0, tail)))
+        # librosa resamples along the last axis, all the mixtures of the file at once
+        mixed_8k = librosa.resample(mixed_16k, orig_sr=sr_16k, target_sr=sr_8k) if with_8k else None
+        yield name, mixed_16k, mixed_8k
+
+
+def write_mixtures(out_dir, name, db_levels, reps, mixed_16k, mixed_8k=None):
+    """Writes every mixture of a file: 16 bit at 16 kHz, and float at 8 kHz as the notebooks did"""
+    for d, db in enumerate(db_levels):
+        for r, rep in enumerate(reps):
+            sf.write(os.path.join(out_dir, mixed_16k_name.format(name=name, db=db, rep=rep)),
+                     mixed_16k[d, r], sr_16k, subtype='PCM_16')
+            if mixed_8k is not None:
+                sf.write(os.path.join(out_dir, mixed_8k_name.format(name=name, db=db, rep=rep)),
+                         mixed_8k[d, r], sr_8k, subtype='FLOAT')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mix every clean .wav of a folder with a noise at several dB levels.')
+    parser.add_argument('clean_dir', type=str, help='Folder of clean .wav files')
+    parser.add_argument('noise_file', type=str, help='Noise added to every clean file')
+    parser.add_argument('-o', dest='out_dir', type=str, default='.', help='Where to write the mixtures')
+    parser.add_argument('--db-levels', dest='db_levels', type=int, nargs='+', default=list(range(10, -21, -2)),
+                        help='Gains (dB) applied to the noise')
+    parser.add_argument('--reps', type=int, nargs='+', default=[0], help='Repetition numbers, each one has its own random offsets')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the random offsets')
+    parser.add_argument('--pad', type=float, default=1.0, help='Seconds of silence added after the clean files')
+    parser.add_argument('--tail', type=float, default=1.0, help='Seconds of silence added after the mixtures')
+    parser.add_argument('--no-8k', dest='with_8k', action='store_false', help='Only write the 16 kHz mixtures')
+    args = parser.parse_args()
+
+    clean_files = [os.path.join(args.clean_dir, file) for file in sorted(os.listdir(args.clean_dir)) if file.endswith('.wav')]
+    os.makedirs(args.out_dir, exist_ok=True)
+    for name, mixed_16k, mixed_8k in noisy_mixtures(clean_files, args.noise_file, args.db_levels, args.reps,
+                                                    args.seed, args.pad, args.tail, args.with_8k):
+        write_mixtures(args.out_dir, name, args.db_levels, args.reps, mixed_16k, mixed_8k)
+        print(f'{name}: {mixed_16k.shape[0] * mixed_16k.shape[1]} mixtures written')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import numpy as np
+import soundfile as sf
+from scipy.signal import lfilter
+import profiling
+from audio_loader import load_many
+from denoise import (audio_to_audio_frame_stack, denoise_frames, frame_length, get_session, hop_length_frame,
+                     model_json_path, model_weights_path, sample_rate)
+from noisy_mix import mix_all, sr_16k, write_mixtures
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarking_script'))
+import asr_multi_threading
+import asr_performance
+from asr_backends import get_backend
+from wer_scoring import AlignmentWriter
+
+'''
+Offline benchmark of the denoise-and-score pipeline on synthetic fixtures.
+Speech-like clean files (harmonics with a syllable envelope) are mixed with coloured noise, written as
+16 kHz wavs with a reference .txt each, then every stage is timed on them:
+decode (read + resample to 8 kHz), framing, stft, predict, istft, wav_write, asr, wer
+and reported as seconds, real-time factor (seconds per second of audio), throughput (seconds of
+audio per second) and peak RSS. stft / predict / istft are the timers of denoise.denoise_frames
+(profiling.timed), the same ones LIT_PROFILE=<file> records in any script.
+Without --weights (or without tensorflow) the U-Net is replaced by a stand-in that returns an
+empty noise model, the report says so; --asr whisper times a real ASR instead of the stub.
+
+To run, and keep the json to compare a later run (or another implementation) against it:
+python pipeline_benchmark.py --files 20 --duration 4 -o bench.json
+python pipeline_benchmark.py --files 20 --duration 4 --weights . --baseline bench.json
+'''
+
+stages = ['decode', 'framing', 'stft', 'predict', 'istft', 'wav_write', 'asr', 'wer']
+vocabulary = ('he hoped there would be stew for dinner turnips and carrots bruised potatoes fat mutton '
+              'pieces to be ladled out in thick peppered flour fattened sauce').split()
+
+
+class StandInModel:
+    """Takes the place of the U-Net when it cannot be loaded: predicts an empty noise model"""
+    output_gain = 10
+
+    def predict(self, X_in, verbose=0):
+        return np.zeros_like(X_in, dtype=np.float32)
+
+
+def synthetic_speech(rng, duration, sr=sr_16k):
+    """Voiced harmonics with a slowly moving pitch, cut into 4 Hz syllables with random pauses"""
+    t = np.arange(int(duration * sr)) / sr
+    f0 = rng.uniform(100, 220) * (1 + 0.05 * np.sin(2 * np.pi * rng.uniform(0.5, 2) * t))
+    phase = 2 * np.pi * np.cumsum(f0) / sr
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 12))
+    syllables = np.maximum(np.sin(2 * np.pi * 4 * t), 0) * np.repeat(rng.random(int(duration * 4) + 1) > 0.2, sr // 4)[:len(t)]
+    speech = voiced * syllables
+    return (0.5 * speech / np.max(np.abs(speech))).astype(np.float32)
+
+
+def synthetic_noise(rng, duration, sr=sr_16k):
+    """Low-pass coloured noise, roughly the spectrum of babble"""
+    noise = lfilter([1.0], [1.0, -0.9], rng.standard_normal(int(duration * sr)))
+    return (0.5 * noise / np.max(np.abs(noise))).astype(np.float32)
+
+
+def make_fixtures(out_dir, nb_files=10, duration=4.0, db_levels=(0, -6), seed=0):
+    """Writes nb_files utterances mixed at every dB level (<utterance>_mixed_<db>db_0.wav, 16 kHz)
+    and their reference <utterance>.txt. Returns the wav paths"""
+    rng = np.random.default_rng(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    noise = synthetic_noise(rng, duration + 2)
+    paths = []
+    for i in range(nb_files):
+        name = f'bench-{i:04d}'
+        mixed = mix_all(synthetic_speech(rng, duration), noise, list(db_levels), 1, rng)
+        write_mixtures(out_dir, name, list(db_levels), [0], mixed)
+        with open(os.path.join(out_dir, f'{name}.txt'), 'w') as file:
+            file.write(' '.join(rng.choice(vocabulary, 12)))
+        paths += [os.path.join(out_dir, f'{name}_mixed_{db}db_0.wav') for db in db_levels]
+    return paths
+
+
+def load_model(weights_dir):
+    """DenoiseSession of weights_dir, or the stand-in when there are no weights / no tensorflow"""
+    if weights_dir is not None:
+        try:
+            return get_session(os.path.join(weights_dir, model_json_path),
+                               os.path.join(weights_dir, model_weights_path)), 'unet'
+        except (ImportError, OSError) as e:
+            print(f'U-Net not available ({e}), using the stand-in model')
+    return StandInModel(), 'stand-in'
+
+
+def run_pipeline(paths, fixtures_dir, out_dir, model, backend):
+    """Runs every stage once on paths, the stages are recorded by the enabled profiler"""
+    profiler = profiling.current()
+    with profiler.stage('decode', files=len(paths)):
+        list_audio = load_many(paths, sample_rate, cache_dir=None, workers=1)
+
+    with profiler.stage('framing', files=len(paths)):
+        list_frames = [audio_to_audio_frame_stack(audio, frame_length, hop_length_frame) for audio in list_audio]
+        frames = np.vstack(list_frames)
+
+    # stft, predict and istft are timed inside denoise_frames
+    denoised = denoise_frames(model, frames) * model.output_gain
+
+    denoised_paths = []
+    with profiler.stage('wav_write', files=len(paths)):
+        start = 0
+        for path, file_frames in zip(paths, list_frames):
+            denoised_paths.append(os.path.join(out_dir, os.path.basename(path)))
+            sf.write(denoised_paths[-1], denoised[start:start + len(file_frames)].reshape(-1), sample_rate, 'PCM_16')
+            start += len(file_frames)
+
+    groups = {}
+    for path in denoised_paths:
+        groups.setdefault(os.path.basename(path).split('_')[0], []).append(path)
+    with AlignmentWriter(os.path.join(out_dir, 'alignments.txt')) as alignment_writer:
+        for utterance, group in groups.items():
+            ref_txt, num_ref_tokens = asr_performance.parse_reference_txt(os.path.join(fixtures_dir, f'{utterance}.txt'))
+            scorer = asr_multi_threading.MultiThreading(backend, ref_txt, num_ref_tokens, alignment_writer=alignment_writer)
+            with profiler.stage('asr', files=len(group)):
+                transcripts = scorer.transcribe_all(group)
+            with profiler.stage('wer', files=len(group)):
+                asr_performance.calculation(list(transcripts), list(transcripts.values()), ref_txt, num_ref_tokens,
+                                            reference=scorer.reference, alignment_writer=alignment_writer)
+
+
+def report(summaries, audio_seconds, nb_files):
+    """Best time of each stage over the runs, with its real-time factor, throughput and peak RSS"""
+    table = {}
+    for stage in stages:
+        seconds = min(summary[stage]['seconds'] for summary in summaries if stage in summary)
+        table[stage] = {'seconds': seconds, 'rtf': seconds / audio_seconds,
+                        'x_realtime': audio_seconds / seconds if seconds else float('inf'),
+                        'files_per_s': nb_files / seconds if seconds else float('inf'),
+                        'peak_rss_mb': max(summary[stage]['peak_rss_mb'] for summary in summaries if stage in summary)}
+    seconds = sum(row['seconds'] for row in table.values())
+    table['total'] = {'seconds': seconds, 'rtf': seconds / audio_seconds, 'x_realtime': audio_seconds / seconds,
+                      'files_per_s': nb_files / seconds, 'peak_rss_mb': profiling.peak_rss_mb()}
+    return table
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time every stage of the denoise-and-score pipeline on synthetic files.')
+    parser.add_argument('--files', type=int, default=10, help='Number of synthetic utterances')
+    parser.add_argument('--duration', type=float, default=4.0, help='Seconds per utterance')
+    parser.add_argument('--db-levels', dest='db_levels', type=int, nargs='+', default=[0, -6], help='Noise levels (dB), one file per level')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the fixtures')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs, the best time of each stage is kept')
+    parser.add_argument('--weights', type=str, help='Folder of Best_json_Unet.json / Best_weight_Unet.h5, stand-in model without it')
+    parser.add_argument('--asr', type=str, default='stub', help='ASR backend (stub, whisper, google)')
+    parser.add_argument('-o', dest='output_file', type=str, help='Write the report to this json file')
+    parser.add_argument('--baseline', type=str, help='json of an earlier run, each stage is compared to it')
+    parser.add_argument('--profile', type=str, help='Also append every timed stage to this json lines file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        fixtures_dir = os.path.join(work_dir, 'fixtures')
+        out_dir = os.path.join(work_dir, 'denoised')
+        os.makedirs(out_dir)
+        paths = make_fixtures(fixtures_dir, args.files, args.duration, args.db_levels, args.seed)
+        audio_seconds = sum(sf.info(path).duration for path in paths)
+        model, model_name = load_model(args.weights)
+        backend = get_backend(args.asr, text_dir=fixtures_dir) if args.asr == 'stub' else get_backend(args.asr)
+
+        summaries = []
+        for _ in range(args.repeat):
+            profiler = profiling.enable(args.profile)
+            run_pipeline(paths, fixtures_dir, out_dir, model, backend)
+            summaries.append(profiler.summary())
+        profiling.disable()
+
+    table = report(summaries, audio_seconds, len(paths))
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r') as file:
+            baseline = json.load(file)['stages']
+
+    print(f'{len(paths)} files, {audio_seconds:.1f} s of audio, model: {model_name}, asr: {args.asr}, best of {args.repeat}')
+    print(f'{"stage":<10} {"seconds":>9} {"RTF":>8} {"x real time":>12} {"files/s":>9} {"peak RSS MB":>12}' + (' vs baseline' if baseline else ''))
+    for stage, row in table.items():
+        line = (f'{stage:<10} {row["seconds"]:>9.3f} {row["rtf"]:>8.4f} {row["x_realtime"]:>12.1f} '
+                f'{row["files_per_s"]:>9.1f} {row["peak_rss_mb"]:>12.1f}')
+        if baseline and stage in baseline and row['seconds']:
+            line += f' {baseline[stage]["seconds"] / row["seconds"]:>8.2f}x'
+        print(line)
+
+    if args.output_file:
+        with open(args.output_file, 'w') as file:
+            json.dump({'commit': git_commit(), 'model': model_name, 'asr': args.asr, 'files': len(paths),
+                       'audio_seconds': audio_seconds, 'config': vars(args), 'stages': table}, file, indent=1)
+        print(f'Saved {args.output_file}')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+'''
+Per-stage timers for the denoise-and-score pipeline. Off by default: timed() costs nothing until a
+profiler is enabled, with enable() or by setting LIT_PROFILE to a file name, e.g.
+  LIT_PROFILE=profile.jsonl python subband.py noisy.wav
+Every timed stage then appends one json line {"stage", "seconds", "peak_rss_mb", ...} to the file,
+and profiling.current().summary() gives the total per stage. pipeline_benchmark.py uses the same
+Profiler to time each stage of a full run.
+'''
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process (MB)"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return float('nan')
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class Profiler:
+    """Collects one record per timed stage; with path, each record is also appended to it as a json line"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.records = []
+
+    def record(self, stage, seconds, **fields):
+        record = {'stage': stage, 'seconds': seconds, 'peak_rss_mb': round(peak_rss_mb(), 1), **fields}
+        self.records.append(record)
+        if self.path is not None:
+            with open(self.path, 'a') as file:
+                file.write(json.dumps(record) + '\n')
+        return record
+
+    @contextmanager
+    def stage(self, name, **fields):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, **fields)
+
+    def summary(self):
+        """{stage: {'calls', 'seconds', 'peak_rss_mb'}} over all the records, in the order the stages first ran"""
+        stages = {}
+        for record in self.records:
+            total = stages.setdefault(record['stage'], {'calls': 0, 'seconds': 0.0, 'peak_rss_mb': 0.0})
+            total['calls'] += 1
+            total['seconds'] += record['seconds']
+            total['peak_rss_mb'] = max(total['peak_rss_mb'], record['peak_rss_mb'])
+        return stages
+
+
+_profiler = Profiler(os.environ['LIT_PROFILE']) if os.environ.get('LIT_PROFILE') else None
+
+
+def enable(path=None):
+    """Starts collecting the timed stages of this process and returns the profiler"""
+    global _profiler
+    _profiler = Profiler(path)
+    return _profiler
+
+
+def disable():
+    global _profiler
+    _profiler = None
+
+
+def current():
+    """The enabled profiler, None when profiling is off"""
+    return _profiler
+
+
+@contextmanager
+def timed(stage, **fields):
+    """Times the block as `stage` if a profiler is enabled, fields are added to its record"""
+    if _profiler is None:
+        yield
+        return
+    with _profiler.stage(stage, **fields):
+        yield
@@ -1,148 +1,101 @@
 import pandas as pd
+import argparse
 import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarking_script'))
+import results_store
 # This version of rearrange corrects the file naming bug and can take the average for different db levels
 def transform_file_name(file_name):
-    if isinstance(file_name, str) and file_name != "nan":
-        parts = file_name.split('_')
-        return '_'.join(parts[2:])
+    # drops the channel1_normalized_ prefix of the files normalized by older versions of the harness
+    if isinstance(file_name, str) and file_name.startswith('channel1_normalized_'):
+        return file_name[len('channel1_normalized_'):]
     return file_name
 
-def db_count(transformed_names):
-    count = 0
-    db_set = set()
-    for file_name in transformed_names:
-        if isinstance(file_name, str) and file_name != "nan":
-            #print(file_name.split('_')[4])
-            db_level = file_name.split('_')[4]
-            db_set.add(db_level)
-    return len(db_set)
-    
-
-
-def edit_xlsx(input_dir,filename,output_dir):
+def read_pairs(input_file_path, mixed='mixed'):
+    """Reads an *_output.xlsx file once and returns the mixed / processed pairs of results_store.war_pairs,
+    joined on (utterance, dB level, repetition) parsed from the file names, W.A.R. in % rounded"""
+    df = pd.read_excel(input_file_path)
+    df = df.dropna(subset=['W.A.R. (%)']).reset_index(drop=True)  # the last row only holds the duration
+    # the file name is the last component of each path, whatever its depth (-sd)
+    file_names = results_store.harness_paths(df).str.split('/').str[-1]
+    results = pd.concat([df[['W.A.R. (%)']], results_store.parse_file_names(file_names)], axis=1)
+    results['source'] = input_file_path
+    results['file'] = file_names.map(transform_file_name)
+    results['war'] = (results['W.A.R. (%)'] * 100).round()
+
+    unparsed = results['utterance'].isna()
+    if unparsed.any():
+        print(f'{os.path.basename(input_file_path)}: {unparsed.sum()} files whose name is not '
+              f'<utterance>_<variant>_<dB>db_<repetition>.wav are left out, e.g. {results.loc[unparsed, "file"].iloc[0]}')
+
+    pairs, unpaired = results_store.war_pairs(results, mixed, return_unpaired=True)
+    if len(unpaired):
+        nb_processed = unpaired['mixed_war'].isna().sum()
+        print(f'{os.path.basename(input_file_path)}: {nb_processed} processed files without a mixed file and '
+              f'{len(unpaired) - nb_processed} mixed files without a processed file are left out')
+    return pairs.sort_values(['variant', 'db', 'utterance', 'rep'], ignore_index=True)
+
+
+def edit_xlsx(input_dir,filename,output_dir,mixed='mixed'):
     '''
         input_dir: the directory input file sits
         filename: takes an excel.xlsx file as input
         output_dir: output as processed_excel.xlsx in output directory, will create one if not exist
+        mixed: variant name of the unprocessed files (174-50561-0010_mixed+-12db_5.wav)
         this function:
         1. get rid of information except filenames and WAR
-        2. rearrange them at mixed and proc with their WAR accordingly and calculate improvement from mixed to proc
-        3. Add the average of each column to the bottom
+        2. pair every processed file with the mixed file of the same utterance, dB level and repetition,
+           and calculate improvement from mixed to proc
+        3. Add the average of each processed variant and dB level after its rows, the Variant column tells them apart
         
         e.g.edit_xlsx('/Users/guzhaowen/Downloads/benchmarking_script_2/excel/','422-122949-0014_output.xlsx','/Users/guzhaowen/Downloads/benchmarking_script_2/processed_excel/')
     '''
     if filename.startswith('~$'):
         print(f"Skipping temporary file: {filename}")
         return
-    
-    input_file_path = input_dir+filename # Path to the input file
-    # print(input_file_path)
-    df = pd.read_excel(input_file_path)
 
-    # Drop the 'Transcript' and '1' columns
-    df = df.drop(columns=['Transcript', '0', 'Deletion error (%)','Insertion error (%)','Substitution error (%)','Reference Text','Duration'])
-    
-    df_sorted = df.sort_values(by='1')
-
-    results = []
-    new_results=[]
-    file_names=[]
-    for _, row in df_sorted.iterrows():
-        results.append(row['W.A.R. (%)'])
-        file_names.append(row['1'])
-        
-    transformed_names = [transform_file_name(name) for name in file_names]
-    
-    db_levels = db_count(transformed_names)
-    #print(f'db levels: {db_levels}')
-    rows = len(df)//2
-    db_section_size = rows//db_levels
-    
-    print(f'db_section_size: {db_section_size}')
-    # for loop gets mixed and proc values by going through i+rows
-    
-    for i in range(0,rows):
-        file_name = transformed_names[i]
-        mixed_res = round(results[i] * 100)
-        proc_res = round(results[i + rows] * 100)
-        imp_res = proc_res - mixed_res
-        new_results.append([file_name,mixed_res,proc_res,imp_res])
-
-            
+    input_file_path = os.path.join(input_dir, filename) # Path to the input file
+    pairs = read_pairs(input_file_path, mixed)
+
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
-        
-    output_file_path = output_dir+'processed_'+filename  # Path for the output file
-
-    results_df = pd.DataFrame(new_results, columns=['File index', 'Mixed W.A.R. (%)', 'Processed W.A.R. (%)', 'Improvement'])
-    #mixavg = results_df['Mixed W.A.R. (%)'].mean()
-    # results_df.loc['Mixed W.A.R. (%)'] = mixavg
-    #procavg=results_df['Processed W.A.R. (%)'].mean()
-    # results_df.loc['Processed W.A.R. (%)'] = procavg
-    #imp = results_df['Improvement'].mean()
-    # results_df.loc['Improvement'] = imp
-    
-    final_results = []
 
-    for i in range(db_levels):
-        start_index = i * db_section_size
-        end_index = (i + 1) * db_section_size if i != db_levels - 1 else len(results_df)
-        section = results_df.iloc[start_index:end_index]
-        
-        # Append the current section to final results
-        final_results.append(section)
-        
-        #if i < db_levels - 1:  # Add the new row except after the last section
-        avg_mixed = section['Mixed W.A.R. (%)'].mean()
-        avg_processed = section['Processed W.A.R. (%)'].mean()
-        avg_improvement = section['Improvement'].mean()
-        
-        avg_row = pd.DataFrame({
-            'File index': ['Average'],
-            'Mixed W.A.R. (%)': [avg_mixed],
-            'Processed W.A.R. (%)': [avg_processed],
-            'Improvement': [avg_improvement]
-        })
-        
-        # Append the average row to final results
-        final_results.append(avg_row)
-    
-    # Concatenate all sections and average rows into the final DataFrame
-    result_df = pd.concat(final_results).reset_index(drop=True)
-    
+    output_file_path = os.path.join(output_dir, 'processed_'+filename)  # Path for the output file
+
+    results_df = pd.DataFrame({'File index': pairs['file'], 'Variant': pairs['variant'], 'Mixed W.A.R. (%)': pairs['mixed_war'],
+                               'Processed W.A.R. (%)': pairs['processed_war'], 'Improvement': pairs['improvement']})
+
+    # one average row per processed variant and dB level, placed after the rows of that section
+    sections = ['variant', 'db']
+    averages = (results_df.drop(columns=['File index', 'Variant']).groupby([pairs[key] for key in sections]).mean()
+                .reset_index())
+    averages['File index'] = 'Average'
+    averages['Variant'] = averages['variant']
+    rows = pd.concat([pairs[sections], results_df], axis=1).assign(is_average=False)
+    result_df = (pd.concat([rows, averages.assign(is_average=True)], ignore_index=True)
+                 .sort_values(sections + ['is_average'], kind='stable')[results_df.columns].reset_index(drop=True))
+
     # Save the final DataFrame to Excel
     result_df.to_excel(output_file_path, index=False)
     print(f"Saved output to {output_file_path}")
-    
-    #mixavg = results_df['Mixed W.A.R. (%)'].mean(skipna=True)
-    #procavg = results_df['Processed W.A.R. (%)'].mean(skipna=True)
-    #impavg = results_df['Improvement'].mean(skipna=True)
-    
+    return output_file_path
 
-    '''
-    for i in range(0, len(results_df), db_iters + 1):
-        if i < len(results_df) and results_df.iloc[i].isnull().all():
-            segment = results_df.iloc[i + 1:i + db_iters + 1]
-            avg_result_1 = segment['Mixed W.A.R. (%)'].mean(skipna=True)
-            avg_result_2 = segment['Processed W.A.R. (%)'].mean(skipna=True)
-            avg_difference = segment['Improvement'].mean(skipna=True)
-            results_df.iloc[i] = ["Average", avg_result_1, avg_result_2, avg_difference]
-    '''
-    #new_results.append(['Average',mixavg,procavg,imp])
-    
-    #results_df = pd.DataFrame(new_results, columns=['File index', 'Mixed W.A.R. (%)', 'Processed W.A.R. (%)', 'Improvement'])
-    
 
-def rearrange_multiple(input_dir, output_dir):
+def rearrange_multiple(input_dir, output_dir, workers=1, mixed='mixed'):
     """
     input_dir: Directory where input Excel files are located.
     output_dir: Directory where processed Excel files will be saved.
+    workers: number of processes, each one handles whole files
     this function is going to organize and process every file in input_dir and output at output_dir
     """
-    for file in os.listdir(input_dir):
-        if file.endswith('xlsx'):
-            edit_xlsx(input_dir, file, output_dir)
-            
+    files = [file for file in sorted(os.listdir(input_dir)) if file.endswith('_output.xlsx') and not file.startswith('~$')]
+    if workers <= 1:
+        return [edit_xlsx(input_dir, file, output_dir, mixed) for file in files]
+    os.makedirs(output_dir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(edit_xlsx, [input_dir] * len(files), files, [output_dir] * len(files), [mixed] * len(files)))
+
 def summary(input_dir, output_file='Summary_Processed.xlsx'):
     """
     input_dir: Directory containing input Excel files (.xlsx).
@@ -174,9 +127,18 @@ def summary(input_dir, output_file='Summary_Processed.xlsx'):
     
 
 def main():
-    # edit_xlsx('/Users/guzhaowen/Downloads/benchmarking_script_2/excel/','422-122949-0014_output.xlsx','/Users/guzhaowen/Downloads/benchmarking_script_2/processed_excel/')
-    rearrange_multiple('/Users/noamargolin/Desktop/benchmarking_script2/excel/',
-    '/Users/noamargolin/Desktop/benchmarking_script2/processed_excel/')
-    #summary('/Users/noamargolin/Desktop/benchmarking_script2/processed_excel/')
+    # e.g. python rearrange_updated.py /Users/noamargolin/Desktop/benchmarking_script2/excel/ /Users/noamargolin/Desktop/benchmarking_script2/processed_excel/ --workers 4
+    parser = argparse.ArgumentParser(description='Pair mixed and processed W.A.R. of every *_output.xlsx and average them per dB level.')
+    parser.add_argument('input_dir', type=str, help='Directory of the *_output.xlsx files')
+    parser.add_argument('output_dir', type=str, help='Where the processed_*.xlsx files are written')
+    parser.add_argument('--workers', type=int, default=1, help='Number of files processed in parallel')
+    parser.add_argument('--mixed', type=str, default='mixed', help='Variant name of the unprocessed files')
+    parser.add_argument('--summary', type=str, help='Also concatenate the processed files into this .xlsx')
+    args = parser.parse_args()
+
+    rearrange_multiple(args.input_dir, args.output_dir, args.workers, args.mixed)
+    if args.summary:
+        summary(args.output_dir, args.summary)
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,92 @@
+import argparse
+import time
+import numpy as np
+from denoise import (audio_to_magnitude_db_and_phase, dim_square_spec, frame_length, hop_length_fft,
+                     magnitude_db_and_phase_to_audio, matrix_spectrogram_to_numpy_audio, n_fft, nb_samples,
+                     numpy_audio_to_matrix_spectrogram)
+
+'''
+Checks that the batched spectrogram front-end and inverse in denoise.py give the same numbers
+as the original frame-by-frame loops, and times both on the create_data workload
+(nb_samples frames of frame_length samples).
+
+To run:
+python spectrogram_benchmark.py --nb-samples 500
+'''
+
+
+def loop_audio_to_matrix_spectrogram(numpy_audio):
+    """Frame-by-frame front-end as the notebooks used to run it"""
+    nb_audio = numpy_audio.shape[0]
+    m_mag_db = np.zeros((nb_audio, dim_square_spec, dim_square_spec))
+    m_phase = np.zeros((nb_audio, dim_square_spec, dim_square_spec), dtype=complex)
+    for i in range(nb_audio):
+        m_mag_db[i, :, :], m_phase[i, :, :] = audio_to_magnitude_db_and_phase(n_fft, hop_length_fft, numpy_audio[i])
+    return m_mag_db, m_phase
+
+
+def loop_matrix_spectrogram_to_audio(m_mag_db, m_phase):
+    """Frame-by-frame inverse as the notebooks used to run it"""
+    list_audio = [magnitude_db_and_phase_to_audio(frame_length, hop_length_fft, m_mag_db[i], m_phase[i])
+                  for i in range(m_mag_db.shape[0])]
+    return np.vstack(list_audio)
+
+
+def check_equivalence(numpy_audio, dtype=np.float64):
+    """Raises AssertionError if the batched functions do not match the loops"""
+    # float32 only keeps about 7 significant digits through the log and the istft
+    tolerance = 1e-6 if dtype == np.float64 else 1e-3
+
+    ref_mag_db, ref_phase = loop_audio_to_matrix_spectrogram(numpy_audio)
+    m_mag_db, m_phase = numpy_audio_to_matrix_spectrogram(numpy_audio, dim_square_spec, n_fft, hop_length_fft, dtype=dtype)
+    assert m_mag_db.dtype == dtype
+    np.testing.assert_allclose(m_mag_db, ref_mag_db, atol=tolerance * 100)  # dB
+    # The phase of bins at the -80 dB floor carries no signal, compare it where it matters
+    audible = ref_mag_db > ref_mag_db.max(axis=(1, 2), keepdims=True) - 60
+    np.testing.assert_allclose(m_phase[audible], ref_phase[audible], atol=tolerance * 10)
+
+    ref_audio = loop_matrix_spectrogram_to_audio(ref_mag_db, ref_phase)
+    audio = matrix_spectrogram_to_numpy_audio(m_mag_db, m_phase, frame_length, hop_length_fft)
+    assert audio.shape == ref_audio.shape
+    np.testing.assert_allclose(audio, ref_audio, atol=tolerance * np.abs(ref_audio).max())
+
+
+def benchmark(numpy_audio, dtype=np.float64, repeat=3):
+    """Returns the best of `repeat` timings (s) of the loop and batched front-end and inverse"""
+    def best(function):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    m_mag_db, m_phase = numpy_audio_to_matrix_spectrogram(numpy_audio, dim_square_spec, n_fft, hop_length_fft, dtype=dtype)
+    return {
+        'Loop STFT': best(lambda: loop_audio_to_matrix_spectrogram(numpy_audio)),
+        'Batched STFT': best(lambda: numpy_audio_to_matrix_spectrogram(numpy_audio, dim_square_spec, n_fft, hop_length_fft, dtype=dtype)),
+        'Loop ISTFT': best(lambda: loop_matrix_spectrogram_to_audio(m_mag_db, m_phase)),
+        'Batched ISTFT': best(lambda: matrix_spectrogram_to_numpy_audio(m_mag_db, m_phase, frame_length, hop_length_fft)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check and time the batched STFT/ISTFT against the frame loops.')
+    parser.add_argument('--nb-samples', dest='nb_samples', type=int, default=nb_samples, help='Number of frames, as in create_data')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the random test frames')
+    args = parser.parse_args()
+
+    # Noise with a decaying envelope looks enough like blended speech frames for timing purposes
+    rng = np.random.default_rng(args.seed)
+    envelope = np.exp(-np.linspace(0, 5, frame_length))
+    numpy_audio = (rng.standard_normal((args.nb_samples, frame_length)) * envelope * 0.1).astype(np.float32)
+
+    for dtype in (np.float64, np.float32):
+        check_equivalence(numpy_audio[:20], dtype=dtype)
+        print(f'{np.dtype(dtype).name}: batched functions match the loops')
+        for key, value in benchmark(numpy_audio, dtype=dtype).items():
+            print(f'  {key}: {value:.3f} s')
+
+
+if __name__ == "__main__":
+    main()
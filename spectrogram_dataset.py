@@ -0,0 +1,103 @@
+# On-disk training set of spectrogram pairs, split into shards that are memory-mapped when read.
+# create_data used to save one noisy_voice_amp_db.npy / voice_amp_db.npy pair that training
+# loaded fully into RAM; shards can be appended one at a time and only the batches that are
+# used are read from disk.
+import json
+import os
+import numpy as np
+
+index_name = 'index.json'
+noisy_voice_name = 'noisy_voice_amp_db'
+voice_name = 'voice_amp_db'
+
+
+def shard_paths(dataset_dir, shard_id):
+    """Returns the noisy voice and clean voice .npy paths of a shard"""
+    return (os.path.join(dataset_dir, f'{noisy_voice_name}_{shard_id:05d}.npy'),
+            os.path.join(dataset_dir, f'{voice_name}_{shard_id:05d}.npy'))
+
+
+def read_index(dataset_dir):
+    """Returns the list of complete shards of dataset_dir, empty if there is none yet"""
+    index_path = os.path.join(dataset_dir, index_name)
+    if not os.path.exists(index_path):
+        return []
+    with open(index_path, 'r') as index_file:
+        return json.load(index_file)['shards']
+
+
+def append_shard(dataset_dir, noisy_voice_amp_db, voice_amp_db, shard_id=None):
+    """This function saves one shard of noisy voice / clean voice spectrograms of size
+    (nb_samples,dim_square_spec,dim_square_spec) and adds it to the index of dataset_dir.
+    A shard only becomes part of the dataset once the index is rewritten, so a shard
+    interrupted while being written is simply generated again"""
+    if noisy_voice_amp_db.shape != voice_amp_db.shape:
+        raise ValueError(f'shape mismatch: {noisy_voice_amp_db.shape} != {voice_amp_db.shape}')
+    os.makedirs(dataset_dir, exist_ok=True)
+
+    shards = [shard for shard in read_index(dataset_dir) if shard['id'] != shard_id]
+    if shard_id is None:
+        shard_id = max([shard['id'] for shard in shards], default=-1) + 1
+
+    for path, data in zip(shard_paths(dataset_dir, shard_id), (noisy_voice_amp_db, voice_amp_db)):
+        # np.save adds .npy to names that do not end with it
+        tmp_path = path[:-len('.npy')] + '_tmp.npy'
+        np.save(tmp_path, data.astype(np.float32, copy=False))
+        os.replace(tmp_path, path)
+
+    shards.append({'id': shard_id, 'nb_samples': int(len(voice_amp_db))})
+    shards.sort(key=lambda shard: shard['id'])
+    tmp_index = os.path.join(dataset_dir, index_name + '.tmp')
+    with open(tmp_index, 'w') as index_file:
+        json.dump({'shards': shards}, index_file, indent=1)
+    os.replace(tmp_index, os.path.join(dataset_dir, index_name))
+    return shard_id
+
+
+class SpectrogramDataset:
+    """Noisy voice / clean voice spectrogram pairs of a sharded dataset directory, memory-mapped.
+    A directory holding the single noisy_voice_amp_db.npy / voice_amp_db.npy pair written by
+    create_data is read as a dataset of one shard."""
+
+    def __init__(self, dataset_dir):
+        self.noisy_voice = []
+        self.voice = []
+        shards = read_index(dataset_dir)
+        if shards:
+            paths = [shard_paths(dataset_dir, shard['id']) for shard in shards]
+        else:
+            paths = [(os.path.join(dataset_dir, noisy_voice_name + '.npy'),
+                      os.path.join(dataset_dir, voice_name + '.npy'))]
+        for noisy_voice_path, voice_path in paths:
+            self.noisy_voice.append(np.load(noisy_voice_path, mmap_mode='r'))
+            self.voice.append(np.load(voice_path, mmap_mode='r'))
+        self.offsets = np.cumsum([0] + [len(voice) for voice in self.voice])
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    @property
+    def spectrogram_shape(self):
+        return self.voice[0].shape[1:]
+
+    def get(self, indices):
+        """Reads the pairs at indices and returns (noisy voice, clean voice) as float32 arrays"""
+        indices = np.asarray(indices)
+        noisy_voice = np.empty((len(indices),) + self.spectrogram_shape, dtype=np.float32)
+        voice = np.empty_like(noisy_voice)
+        shard_of = np.searchsorted(self.offsets, indices, side='right') - 1
+        # Read shard by shard, in index order, so a memory-mapped shard is read sequentially
+        for shard in np.unique(shard_of):
+            rows = np.flatnonzero(shard_of == shard)
+            local = indices[rows] - self.offsets[shard]
+            order = np.argsort(local)
+            noisy_voice[rows[order]] = self.noisy_voice[shard][local[order]]
+            voice[rows[order]] = self.voice[shard][local[order]]
+        return noisy_voice, voice
+
+
+def split_indices(nb_samples, test_size=0.10, random_state=42):
+    """Shuffled train / validation split of the sample indices, like train_test_split does on the arrays"""
+    indices = np.random.RandomState(random_state).permutation(nb_samples)
+    nb_test = int(np.ceil(test_size * nb_samples))
+    return indices[nb_test:], indices[:nb_test]
@@ -0,0 +1,195 @@
+import argparse
+import time
+import librosa
+import numpy as np
+import soundfile as sf
+from denoise import (DenoiseSession, audio_to_audio_frame_stack, crossfade_ramp, denoise_frames, frame_length,
+                     hop_length_frame, sample_rate)
+
+'''
+Streaming version of prediction() for live transcription.
+prediction() waits for the whole file, so nothing comes out until every 8064-sample
+frame has been through the network. StreamingDenoiser takes PCM blocks of any size as
+they arrive and keeps the last frame_length input samples as context, so the STFT
+window of the network input always spans block boundaries.
+Every `hop` new samples the network is run on the most recent frame_length samples and
+the `hop` samples that sit `lookahead` samples before the end of that frame are emitted.
+The right edge of a frame is where the ISTFT is least reliable, so the lookahead trades
+delay for quality; the delay is bounded by hop + lookahead samples.
+Each frame is scaled to its own dB reference, so consecutive hops do not meet exactly. Every
+network call also denoises the `crossfade` samples after its hop (they are part of the lookahead,
+the delay does not change) and they are faded into the next hop with the raised-cosine ramp of
+denoise.overlap_add, instead of a hard step at every hop. crossfade=0 cuts hops back to back.
+
+To run the latency/real-time-factor benchmark against the batch path:
+python stream_denoise.py noisy.wav --block 256 --hop 1008 --lookahead 2016 --crossfade 1008 -o denoised.wav
+'''
+
+
+class StreamingDenoiser:
+    def __init__(self, model, hop: int = 1008, lookahead: int = 2016, output_gain: float = 10, crossfade: int = None):
+        if hop <= 0 or lookahead < 0 or hop + lookahead > frame_length:
+            raise ValueError(f'hop + lookahead must be in (0, {frame_length}], got {hop} + {lookahead}')
+        if crossfade is None:
+            crossfade = min(hop, lookahead)
+        if not 0 <= crossfade <= min(hop, lookahead):
+            raise ValueError(f'crossfade must be in [0, min(hop, lookahead)] = [0, {min(hop, lookahead)}], got {crossfade}')
+        self.model = model
+        self.hop: int = hop
+        self.lookahead: int = lookahead
+        self.output_gain: float = output_gain  # prediction() scales its output by 10
+        self.crossfade: int = crossfade
+        self.fade_in = crossfade_ramp(crossfade)
+        self.reset()
+
+    @property
+    def delay(self) -> int:
+        """Maximum number of samples between an input sample arriving and its denoised output"""
+        return self.hop + self.lookahead
+
+    def reset(self):
+        """Forget the stream context, the next block starts a new stream"""
+        self.history = np.zeros(frame_length, dtype=np.float32)  # last frame_length input samples
+        self.pending = np.zeros(0, dtype=np.float32)  # input samples not yet covering a full hop
+        self.tail = np.zeros(self.crossfade, dtype=np.float32)  # denoised samples after the last hop, faded out
+        self.to_skip = self.lookahead  # leading output samples that belong before the stream start
+        self.nb_input = 0
+        self.nb_output = 0
+
+    def process(self, block) -> np.ndarray:
+        """Push a block of PCM samples and return the denoised samples that became ready"""
+        block = np.asarray(block, dtype=np.float32)
+        self.nb_input += len(block)
+        self.pending = np.concatenate([self.pending, block])
+        nb_hops = len(self.pending) // self.hop
+        if nb_hops == 0:
+            return np.zeros(0, dtype=np.float32)
+
+        # All complete hops of this block are denoised in one predict call
+        consumed = nb_hops * self.hop
+        context = np.concatenate([self.history, self.pending[:consumed]])
+        frames = audio_to_audio_frame_stack(context[self.hop:], frame_length, self.hop)
+        self.history = context[-frame_length:]
+        self.pending = self.pending[consumed:]
+
+        denoised = denoise_frames(self.model, frames) * self.output_gain
+        end = frame_length - self.lookahead
+        segments = denoised[:, end - self.hop:end + self.crossfade].astype(np.float32)
+        # the start of each hop is faded in over the end of the previous segment
+        for segment in segments:
+            segment[:self.crossfade] = segment[:self.crossfade] * self.fade_in + self.tail * self.fade_in[::-1]
+            self.tail = segment[self.hop:]
+        out = segments[:, :self.hop].reshape(-1)
+
+        if self.to_skip:
+            skipped = min(self.to_skip, len(out))
+            out = out[skipped:]
+            self.to_skip -= skipped
+        self.nb_output += len(out)
+        return out
+
+    def flush(self) -> np.ndarray:
+        """Push silence through the model so every input sample has a denoised output sample"""
+        missing = self.nb_input - self.nb_output
+        if missing <= 0:
+            return np.zeros(0, dtype=np.float32)
+        # lookahead + hop zeros always push the last real sample out of the model
+        padding = self.lookahead + self.hop
+        out = self.process(np.zeros(padding, dtype=np.float32))[:missing]
+        # only padding is left in pending, it must not be taken for input by a later process call
+        self.pending = self.pending[:0]
+        self.nb_input -= padding
+        self.nb_output = self.nb_input
+        return out
+
+
+def denoise_stream(model, blocks, hop=1008, lookahead=2016, crossfade=None):
+    """This function takes an iterable of PCM blocks (a generator reading a microphone or a
+    file) and yields the denoised audio as soon as it is available"""
+    denoiser = StreamingDenoiser(model, hop=hop, lookahead=lookahead, crossfade=crossfade)
+    for block in blocks:
+        out = denoiser.process(block)
+        if len(out):
+            yield out
+    out = denoiser.flush()
+    if len(out):
+        yield out
+
+
+def benchmark(model, audio, block_size=256, hop=1008, lookahead=2016, crossfade=None):
+    """This function compares the batch path of prediction() and StreamingDenoiser on the same
+    audio and returns latency to first output (s) and real-time factor of both.
+    prediction() skips audio shorter than one frame, the batch path is then timed on the audio
+    padded with zeros to one frame"""
+    if len(audio) == 0:
+        raise ValueError('audio is empty')
+    duration = len(audio) / sample_rate
+
+    # Batch path: nothing comes out until the whole file is processed
+    start = time.perf_counter()
+    if len(audio) < frame_length:
+        audio_batch = np.concatenate([audio, np.zeros(frame_length - len(audio), dtype=audio.dtype)])
+    else:
+        audio_batch = audio
+    frames = audio_to_audio_frame_stack(audio_batch, frame_length, hop_length_frame)
+    denoise_frames(model, frames)
+    batch_time = time.perf_counter() - start
+
+    # Streaming path: blocks are fed as they would arrive from a live source
+    denoiser = StreamingDenoiser(model, hop=hop, lookahead=lookahead, crossfade=crossfade)
+    stream_time = 0.0
+    first_output = None
+    for start_sample in range(0, len(audio), block_size):
+        block = audio[start_sample:start_sample + block_size]
+        start = time.perf_counter()
+        out = denoiser.process(block)
+        stream_time += time.perf_counter() - start
+        if first_output is None and len(out):
+            # audio time at which the block arrived plus the time spent so far on it
+            first_output = (start_sample + len(block)) / sample_rate + (time.perf_counter() - start)
+    start = time.perf_counter()
+    out = denoiser.flush()
+    stream_time += time.perf_counter() - start
+    if first_output is None and len(out):
+        # audio shorter than hop + lookahead only comes out when the stream is flushed
+        first_output = duration + stream_time
+
+    return {
+        'Duration (s)': duration,
+        'Batch first output (s)': duration + batch_time,
+        'Batch RTF': batch_time / duration,
+        'Stream first output (s)': first_output,
+        'Stream delay (s)': denoiser.delay / sample_rate,
+        'Stream RTF': stream_time / duration,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Denoise a file block by block and benchmark it against the batch path.')
+    parser.add_argument('audio_file', type=str, help='Path to the noisy .wav file')
+    parser.add_argument('--block', type=int, default=256, help='Number of samples per incoming block')
+    parser.add_argument('--hop', type=int, default=1008, help='Number of new samples between two network calls')
+    parser.add_argument('--lookahead', type=int, default=2016, help='Number of future samples used before emitting output')
+    parser.add_argument('--crossfade', type=int, help='Number of samples faded between two hops, min(hop, lookahead) by default')
+    parser.add_argument('-o', dest='output_file', type=str, help='If set, write the streamed output to this .wav file')
+    args = parser.parse_args()
+
+    audio, _ = librosa.load(args.audio_file, sr=sample_rate)
+    if len(audio) == 0:
+        print(f'{args.audio_file} has no samples')
+        return
+    session = DenoiseSession(warmup=True)
+
+    results = benchmark(session, audio, args.block, args.hop, args.lookahead, args.crossfade)
+    for key, value in results.items():
+        print(f'{key}: {value:.3f}' if value is not None else f'{key}: n/a')
+
+    if args.output_file:
+        blocks = (audio[i:i + args.block] for i in range(0, len(audio), args.block))
+        denoised = np.concatenate(list(denoise_stream(session, blocks, args.hop, args.lookahead, args.crossfade)))
+        sf.write(args.output_file, denoised, sample_rate, 'PCM_24')
+        print(f'Saved output to {args.output_file}')
+
+
+if __name__ == "__main__":
+    main()
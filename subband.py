@@ -0,0 +1,126 @@
+import argparse
+import os
+from functools import lru_cache
+import librosa
+import numpy as np
+import soundfile as sf
+from scipy.signal import butter, lfilter
+from audio_loader import load_audio
+from denoise import get_session, model_json_path, model_weights_path, ola_hop_length
+from noisy_mix import db_to_gain
+
+'''
+Sub-band processing of the adaptive gain experiment (automate_multifiles in AUG_21_adaptiveG).
+From a 16 kHz noisy mixture the notebook builds four branches:
+HPG : the mixture high-passed at 4 kHz
+FBG : the full band mixture
+LBN : the mixture resampled to 8 kHz and denoised by the U-Net (low band)
+HBN : the mixture multiplied by (-1)**n, which mirrors the 4-8 kHz band into 0-4 kHz, resampled
+      to 8 kHz, denoised, brought back to 16 kHz and multiplied by (-1)**n again (high band)
+and sums HBN + LBN (HBN&LBN), then HBN&LBN + HPG.
+Every step used to go through an exported and re-imported wav. Here the branches stay in memory:
+the filter design and the (-1)**n vectors are cached, the mixtures are processed as one array,
+and the LBN and HBN inputs of all the mixtures go through the network in a single batched call.
+subband_branches returns the branches at unity gain; combine only scales and adds them, so a
+gain1..gain4 grid only costs one inference per mixture.
+
+To write the combined outputs of a few mixtures:
+python subband.py noisy_16k_1.wav noisy_16k_2.wav -o /content/ --gains -6 0 0 0
+'''
+
+sr_16k = 16000
+sr_8k = 8000
+cutoff_frequency = 4000
+
+
+@lru_cache(maxsize=None)
+def butter_highpass(cutoff, fs, order=5):
+    nyq = 0.5 * fs
+    normal_cutoff = cutoff / nyq
+    b, a = butter(order, normal_cutoff, btype='high', analog=False)
+    return b, a
+
+
+def highpass_filter(data, cutoff, fs, order=5):
+    """High-pass filter of data along its last axis, the filter is only designed once"""
+    b, a = butter_highpass(cutoff, fs, order=order)
+    return lfilter(b, a, data, axis=-1)
+
+
+@lru_cache(maxsize=16)
+def modulation(length):
+    """(-1)**n for n in range(length), read-only float32"""
+    vector = np.ones(length, dtype=np.float32)
+    vector[1::2] = -1
+    vector.flags.writeable = False
+    return vector
+
+
+def flip_spectrum(audio):
+    """Multiplies audio by (-1)**n along its last axis: frequency f becomes sr/2 - f"""
+    return audio * modulation(audio.shape[-1])
+
+
+def subband_branches(session, mixed_16k, cutoff=cutoff_frequency, hop=None):
+    """This function takes mixtures at 16 kHz, one 1D array or a (nb_mixtures, samples) array, and
+    returns a dict of (nb_mixtures, length) arrays with the branches at unity gain:
+    'mixed', 'HPG', 'FBG', 'LBN' and 'HBN', all cut to the length of the denoised branches.
+    session is a DenoiseSession, both neural branches of every mixture are denoised in one call.
+    With a hop the network runs by overlap-add (DenoiseSession.denoise_many) and the branches keep
+    the whole mixture, without it they stop at the last full 8064-sample frame"""
+    mixed_16k = np.atleast_2d(np.asarray(mixed_16k, dtype=np.float32))
+    nb_mixtures = mixed_16k.shape[0]
+
+    # 16 kHz -> 8 kHz for the low band and the mirrored high band, all the mixtures at once
+    low_8k = librosa.resample(mixed_16k, orig_sr=sr_16k, target_sr=sr_8k)
+    high_8k = librosa.resample(flip_spectrum(mixed_16k), orig_sr=sr_16k, target_sr=sr_8k)
+
+    denoised = np.stack(session.denoise_many(list(low_8k) + list(high_8k), hop))
+    denoised_16k = librosa.resample(denoised, orig_sr=sr_8k, target_sr=sr_16k)
+    # overlap-add keeps the length at 8 kHz, the resampling round trip may add a sample
+    length = min(denoised_16k.shape[-1], mixed_16k.shape[-1])
+
+    return {
+        'mixed': mixed_16k[:, :length],
+        'HPG': highpass_filter(mixed_16k[:, :length], cutoff, sr_16k).astype(np.float32),
+        'FBG': mixed_16k[:, :length],
+        'LBN': denoised_16k[:nb_mixtures, :length],
+        'HBN': flip_spectrum(denoised_16k[nb_mixtures:, :length]),
+    }
+
+
+def combine(branches, gain1=-6, gain2=0, gain3=0, gain4=0):
+    """This function applies the gains (dB) of automate_multifiles to the branches of subband_branches:
+    gain1 on HBN, gain2 on LBN, gain3 on HPG and gain4 on FBG, and returns the outputs the notebook
+    exported: 'HBN&LBN' = HBN + LBN, 'HPG' = HBN&LBN + HPG and 'FBG'.
+    Sums saturate at full scale like pydub's overlay"""
+    hbn_lbn = db_to_gain(gain1) * branches['HBN'] + db_to_gain(gain2) * branches['LBN']
+    np.clip(hbn_lbn, -1, 32767 / 32768, out=hbn_lbn)
+    hpg = np.clip(hbn_lbn + db_to_gain(gain3) * branches['HPG'], -1, 32767 / 32768)
+    return {'HBN&LBN': hbn_lbn, 'HPG': hpg, 'FBG': db_to_gain(gain4) * branches['FBG']}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sub-band denoising (HBN&LBN, HPG, FBG) of 16 kHz noisy files.')
+    parser.add_argument('files', type=str, nargs='+', help='Noisy .wav files, resampled to 16 kHz if needed')
+    parser.add_argument('-o', dest='out_dir', type=str, default='.', help='Where to write the outputs')
+    parser.add_argument('--gains', type=float, nargs=4, default=[-6, 0, 0, 0], metavar=('G1', 'G2', 'G3', 'G4'),
+                        help='dB gains of HBN, LBN, HPG and FBG')
+    parser.add_argument('--weights', type=str, default='.', help='Folder of Best_json_Unet.json / Best_weight_Unet.h5')
+    parser.add_argument('--ola', action='store_true', help=f'Overlap-add inference (hop {ola_hop_length}), the outputs keep the length of the inputs')
+    args = parser.parse_args()
+
+    session = get_session(os.path.join(args.weights, model_json_path), os.path.join(args.weights, model_weights_path))
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    for file in args.files:
+        name = os.path.splitext(os.path.basename(file))[0]
+        outputs = combine(subband_branches(session, load_audio(file, sr_16k, None), hop=ola_hop_length if args.ola else None),
+                          *args.gains)
+        for key, output_name in (('HBN&LBN', 'combined_HBN&LBN'), ('HPG', 'combined_HPG'), ('FBG', 'FBGproc')):
+            sf.write(os.path.join(args.out_dir, f'{name}_{output_name}.wav'), outputs[key][0], sr_16k, subtype='PCM_16')
+        print(f'{name}: done')
+
+
+if __name__ == "__main__":
+    main()
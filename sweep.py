@@ -0,0 +1,182 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+from adaptive_gain import adaptive_mix, global_mix
+from audio_loader import default_cache_dir, load_audio
+from noisy_mix import file_rng, mix_all, sr_16k
+from subband import combine, subband_branches
+
+'''
+Sweep of the adaptive gain experiment over a grid of clean files x dB levels x repetitions x gains.
+The AUG_* notebooks ran it as nested loops in one process (for i in range(-16,-17,-6), for j in
+range(1,31), gain1..gain4 and alpha edited by hand) and left thousands of wavs behind. Here the
+grid is described in a json file, every (clean file, dB level) cell is run by a pool of worker
+processes that each load the U-Net once, and every output is scored against its clean
+reference (scale-invariant SDR, in dB) instead of being written to disk.
+A finished cell is saved in <out_dir>/cells_<grid hash>/, so a sweep that is stopped and started
+again only runs the missing cells. All the cells are gathered in <out_dir>/results.csv.
+
+grid.json:
+{
+  "clean_dir": "/content/wav_files_toprocess",
+  "noise_file": "pharrell-williams-happy_16khz.wav",
+  "db_levels": [-16, -10],
+  "reps": [1, 2, 3],
+  "gains": [[-6, 0, 0, 0], [0, 0, 0, 0]],
+  "alphas": [0.1, 1],
+  "seed": 0
+}
+"pad_seconds" (1.0 by default) is the silence added after each clean file, like the notebooks' one_sec,
+so that the last second survives the back-to-back frames of the U-Net. With "ola_hop": 4032 the
+network runs by overlap-add on exactly the length of the mixture and "pad_seconds": 0 is enough.
+To run:
+python sweep.py grid.json -o sweep_results/ --workers 4
+'''
+
+grid_defaults = {'db_levels': [-16], 'reps': [0], 'gains': [[-6, 0, 0, 0]], 'alphas': [1], 'seed': 0,
+                 'pad_seconds': 1.0, 'ola_hop': None, 'weights_dir': '.'}
+
+# session of the current worker process, set by _init_worker
+_worker_session = None
+
+
+def read_grid(grid_path):
+    with open(grid_path, 'r') as grid_file:
+        grid = {**grid_defaults, **json.load(grid_file)}
+    if 'clean_files' not in grid:
+        grid['clean_files'] = [os.path.join(grid['clean_dir'], file) for file in sorted(os.listdir(grid['clean_dir']))
+                               if file.endswith('.wav')]
+    return grid
+
+
+def grid_hash(grid):
+    """Short hash of everything that changes the results of a cell"""
+    keys = ('noise_file', 'reps', 'gains', 'alphas', 'seed', 'pad_seconds', 'weights_dir')
+    if grid['ola_hop'] is not None:
+        keys += ('ola_hop',)  # grids without it keep their hash, and their finished cells
+    text = json.dumps({key: grid[key] for key in keys}, sort_keys=True)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:10]
+
+
+def si_sdr(estimate, reference):
+    """Scale-invariant SDR (dB) of estimate against reference along the last axis"""
+    estimate = estimate - estimate.mean(axis=-1, keepdims=True)
+    reference = reference - reference.mean(axis=-1, keepdims=True)
+    scale = np.sum(estimate * reference, axis=-1, keepdims=True) / (np.sum(reference ** 2, axis=-1, keepdims=True) + 1e-10)
+    target = scale * reference
+    return 10 * np.log10(np.sum(target ** 2, axis=-1) / (np.sum((estimate - target) ** 2, axis=-1) + 1e-10) + 1e-10)
+
+
+def cell_path(cells_dir, clean_file, db):
+    name = os.path.splitext(os.path.basename(clean_file))[0]
+    return os.path.join(cells_dir, f'{name}_{db}db.csv')
+
+
+def run_cell(session, grid, clean_file, db):
+    """This function makes the len(reps) mixtures of clean_file at db, denoises them in one batched call
+    and returns one row per (repetition, gains, alpha, output) with the SI-SDR of the output.
+    The mixtures depend on the seed, the file name and db only"""
+    name = os.path.splitext(os.path.basename(clean_file))[0]
+    noise = load_audio(grid['noise_file'], sr_16k, default_cache_dir)
+    pad = np.zeros(int(grid['pad_seconds'] * sr_16k), dtype=np.float32)
+    clean = np.concatenate([load_audio(clean_file, sr_16k, default_cache_dir), pad])
+    mixed, clean_crops = mix_all(clean, noise, [db], len(grid['reps']), file_rng(grid['seed'], f'{name}_{db}db'),
+                                 return_clean=True)
+
+    branches = subband_branches(session, mixed[0], hop=grid['ola_hop'])
+    length = branches['mixed'].shape[-1]
+    reference = clean_crops[0, :, :length]
+
+    rows = []
+
+    def add_rows(output, scores, gains=(np.nan,) * 4, alpha=np.nan):
+        for rep, score in zip(grid['reps'], scores):
+            rows.append({'file': name, 'db': db, 'rep': rep, 'gain1': gains[0], 'gain2': gains[1], 'gain3': gains[2],
+                         'gain4': gains[3], 'alpha': alpha, 'output': output, 'si_sdr': float(score)})
+
+    add_rows('mixed', si_sdr(branches['mixed'], reference))
+    for gains in grid['gains']:
+        outputs = combine(branches, *gains)
+        for key in ('HBN&LBN', 'HPG', 'FBG'):
+            add_rows(key, si_sdr(outputs[key], reference), gains)
+        for alpha in grid['alphas']:
+            adaptive = np.stack([adaptive_mix(x, y, alpha) for x, y in zip(outputs['HBN&LBN'], branches['mixed'])])
+            obadded = np.stack([global_mix(x, y, alpha) for x, y in zip(outputs['HBN&LBN'], branches['mixed'])])
+            add_rows('adaptive', si_sdr(adaptive, reference), gains, alpha)
+            add_rows('obadded', si_sdr(obadded, reference), gains, alpha)
+    return pd.DataFrame(rows)
+
+
+def save_cell(cells_dir, clean_file, db, table):
+    # write to a temporary file then rename, an interrupted cell is simply run again
+    path = cell_path(cells_dir, clean_file, db)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    table.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def _init_worker(weights_dir, threads):
+    global _worker_session
+    import tensorflow as tf
+    from denoise import get_session, model_json_path, model_weights_path
+    # share the cores between the workers instead of each one using all of them
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    _worker_session = get_session(os.path.join(weights_dir, model_json_path),
+                                  os.path.join(weights_dir, model_weights_path))
+
+
+def _run_and_save(grid, cells_dir, clean_file, db):
+    start = time.perf_counter()
+    table = run_cell(_worker_session, grid, clean_file, db)
+    save_cell(cells_dir, clean_file, db, table)
+    return clean_file, db, len(table), time.perf_counter() - start
+
+
+def run_sweep(grid, out_dir, workers=1):
+    """Runs the cells of grid that are not saved yet in out_dir and returns the table of all the cells"""
+    cells_dir = os.path.join(out_dir, f'cells_{grid_hash(grid)}')
+    os.makedirs(cells_dir, exist_ok=True)
+    with open(os.path.join(cells_dir, 'grid.json'), 'w') as grid_file:
+        json.dump(grid, grid_file, indent=1)
+
+    cells = [(clean_file, db) for clean_file in grid['clean_files'] for db in grid['db_levels']]
+    todo = [cell for cell in cells if not os.path.exists(cell_path(cells_dir, *cell))]
+    print(f'{len(cells) - len(todo)}/{len(cells)} cells already done, {len(todo)} to run')
+
+    if todo:
+        workers = max(1, min(workers, len(todo)))
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        # spawn, not fork: every worker loads its own tensorflow and model
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_worker, initargs=(grid['weights_dir'], threads)) as pool:
+            futures = [pool.submit(_run_and_save, grid, cells_dir, clean_file, db) for clean_file, db in todo]
+            for done, future in enumerate(as_completed(futures), 1):
+                clean_file, db, nb_rows, duration = future.result()
+                print(f'[{done}/{len(todo)}] {os.path.basename(clean_file)} {db} dB: {nb_rows} rows in {duration:.1f} s')
+
+    return pd.concat([pd.read_csv(cell_path(cells_dir, *cell)) for cell in cells], ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the adaptive gain experiment over a grid of files, dB levels, repetitions and gains.')
+    parser.add_argument('grid', type=str, help='json file describing the grid')
+    parser.add_argument('-o', dest='out_dir', type=str, default='sweep_results', help='Where to keep the finished cells and the results')
+    parser.add_argument('--workers', type=int, default=1, help='Number of worker processes, each one loads the model')
+    args = parser.parse_args()
+
+    table = run_sweep(read_grid(args.grid), args.out_dir, args.workers)
+    results_path = os.path.join(args.out_dir, 'results.csv')
+    table.to_csv(results_path, index=False)
+    print(f'Saved {len(table)} rows to {results_path}')
+    print(table.groupby(['db', 'output'])['si_sdr'].mean().unstack())
+
+
+if __name__ == "__main__":
+    main()
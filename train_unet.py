@@ -0,0 +1,274 @@
+# U-Net training (Audio_denoising_Training notebook).
+# Batches are read from a memory-mapped SpectrogramDataset and scaled one at a time, so the
+# size of the training set is not limited by host memory.
+import os
+import matplotlib.pyplot as plt
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.callbacks import ModelCheckpoint
+from tensorflow.keras.layers import Input, Conv2D, LeakyReLU, MaxPooling2D, Dropout, concatenate, UpSampling2D
+from tensorflow.keras.models import Model
+from tensorflow.keras.utils import Sequence
+from audio_loader import default_cache_dir
+from denoise import audio_files_to_numpy, load_model, model_json_path, model_weights_path, scaled_in, scaled_ou
+from spectrogram_dataset import SpectrogramDataset, split_indices
+from training_data import mixed_batches, remove_ds_store
+
+
+#Unet network
+def unet(input_size = (128,128,1)):
+    #size filter input
+    size_filter_in = 16
+    #normal initialization of weights
+    kernel_init = 'he_normal'
+    #To apply leaky relu after the conv layer
+    activation_layer = None
+    inputs = Input(input_size)
+    conv1 = Conv2D(size_filter_in, 3, activation = activation_layer, padding = 'same', kernel_initializer = kernel_init)(inputs)
+    conv1 = LeakyReLU()(conv1)
+    conv1 = Conv2D(size_filter_in, 3, activation = activation_layer, padding = 'same', kernel_initializer = kernel_init)(conv1)
+    conv1 = LeakyReLU()(conv1)
+    pool1 = MaxPooling2D(pool_size=(2, 2))(conv1)
+    conv2 = Conv2D(size_filter_in*2, 3, activation = activation_layer, padding = 'same', kernel_initializer = kernel_init)(pool1)
+    conv2 = LeakyReLU()(conv2)
+    conv2 = Conv2D(size_filter_in*2, 3, activation = activation_layer, padding = 'same', kernel_initializer = kernel_init)(conv2)
+    conv2 = LeakyReLU()(conv2)
+    pool2 = MaxPooling2D(pool_size=(2, 2))(conv2)
+    conv3 = Conv2D(size_filter_in*4, 3, activation = activation_layer, padding = 'same', kernel_initializer = kernel_init)(pool2)
+    conv3 = LeakyReLU()(conv3)
+    conv3 = Conv2D(size_filter_in*4, 3, activation = activation_layer, padding = 'same', kernel_initializer = kernel_init)(conv3)
+    conv3 = LeakyReLU()(conv3)
+    pool3 = MaxPooling2D(pool_size=(2, 2))(conv3)
+    conv4 = Conv2D(size_filter_in*8, 3, activation = activation_layer, padding = 'same', kernel_initializer = kernel_init)(pool3)
+    conv4 = LeakyReLU()(conv4)
+    conv4 = Conv2D(size_filter_in*8, 3, activation = activation_layer, padding = 'same', kernel_initializer = kernel_init)(conv4)
+    conv4 = LeakyReLU()(conv4)
+    drop4 = Dropout(0.5)(conv4)
+    pool4 = MaxPooling2D(pool_size=(2, 2))(drop4)
+
+    conv5 = Conv2D(size_filter_in*16, 3, activation = activation_layer, padding = 'same', kernel_initializer = kernel_init)(pool4)
+    conv5 = LeakyReLU()(conv5)
+    conv5 = Conv2D(size_filter_in*16, 3, activation = activation_layer, padding = 'same', kernel_initializer = kernel_init)(conv5)
+    conv5 = LeakyReLU()(conv5)
+    drop5 = Dropout(0.5)(conv5)
+
+    up6 = Conv2D(size_filter_in*8, 2, activation = activation_layer, padding = 'same', kernel_initializer = kernel_init)(UpSampling2D(size = (2,2))(drop5))
+    up6 = LeakyReLU()(up6)
+    merge6 = concatenate([drop4,up6], axis = 3)
+    conv6 = Conv2D(size_filter_in*8, 3, activation = activation_layer, padding = 'same', kernel_initializer = kernel_init)(merge6)
+    conv6 = LeakyReLU()(conv6)
+    conv6 = Conv2D(size_filter_in*8, 3, activation = activation_layer, padding = 'same', kernel_initializer = kernel_init)(conv6)
+    conv6 = LeakyReLU()(conv6)
+    up7 = Conv2D(size_filter_in*4, 2, activation = activation_layer, padding = 'same', kernel_initializer = kernel_init)(UpSampling2D(size = (2,2))(conv6))
+    up7 = LeakyReLU()(up7)
+    merge7 = concatenate([conv3,up7], axis = 3)
+    conv7 = Conv2D(size_filter_in*4, 3, activation = activation_layer, padding = 'same', kernel_initializer = kernel_init)(merge7)
+    conv7 = LeakyReLU()(conv7)
+    conv7 = Conv2D(size_filter_in*4, 3, activation = activation_layer, padding = 'same', kernel_initializer = kernel_init)(conv7)
+    conv7 = LeakyReLU()(conv7)
+    up8 = Conv2D(size_filter_in*2, 2, activation = activation_layer, padding = 'same', kernel_initializer = kernel_init)(UpSampling2D(size = (2,2))(conv7))
+    up8 = LeakyReLU()(up8)
+    merge8 = concatenate([conv2,up8], axis = 3)
+    conv8 = Conv2D(size_filter_in*2, 3, activation = activation_layer, padding = 'same', kernel_initializer = kernel_init)(merge8)
+    conv8 = LeakyReLU()(conv8)
+    conv8 = Conv2D(size_filter_in*2, 3, activation = activation_layer, padding = 'same', kernel_initializer = kernel_init)(conv8)
+    conv8 = LeakyReLU()(conv8)
+
+    up9 = Conv2D(size_filter_in, 2, activation = activation_layer, padding = 'same', kernel_initializer = kernel_init)(UpSampling2D(size = (2,2))(conv8))
+    up9 = LeakyReLU()(up9)
+    merge9 = concatenate([conv1,up9], axis = 3)
+    conv9 = Conv2D(size_filter_in, 3, activation = activation_layer, padding = 'same', kernel_initializer = kernel_init)(merge9)
+    conv9 = LeakyReLU()(conv9)
+    conv9 = Conv2D(size_filter_in, 3, activation = activation_layer, padding = 'same', kernel_initializer = kernel_init)(conv9)
+    conv9 = LeakyReLU()(conv9)
+    conv9 = Conv2D(2, 3, activation = activation_layer, padding = 'same', kernel_initializer = kernel_init)(conv9)
+    conv9 = LeakyReLU()(conv9)
+    conv10 = Conv2D(1, 1, activation = 'tanh')(conv9)
+
+    model = Model(inputs,conv10)
+
+    model.compile(optimizer = 'adam', loss = tf.keras.losses.MeanSquaredError(), metrics = ['mae'])
+    #model.summary()
+    return model
+
+class SpectrogramSequence(Sequence):
+    """Keras batches of (scaled noisy voice, scaled noise model) read from a SpectrogramDataset.
+    The noise model X_in - X_ou and the scaling are computed per batch instead of on the
+    whole training set. preprocess is applied to the network input of every batch"""
+
+    def __init__(self, dataset, indices, batch_size, shuffle=True, preprocess=None, seed=42):
+        super().__init__()
+        self.dataset = dataset
+        self.indices = np.array(indices)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.preprocess = preprocess
+        self.rng = np.random.RandomState(seed)
+        self.on_epoch_end()
+
+    def __len__(self):
+        return int(np.ceil(len(self.indices) / self.batch_size))
+
+    def __getitem__(self, index):
+        batch = self.indices[index * self.batch_size:(index + 1) * self.batch_size]
+        X_in, X_ou = self.dataset.get(batch)
+        #Model of noise to predict
+        X_ou = X_in - X_ou
+        #to scale between -1 and 1
+        X_in = scaled_in(X_in)[..., np.newaxis]
+        X_ou = scaled_ou(X_ou)[..., np.newaxis]
+        if self.preprocess is not None:
+            X_in = self.preprocess(X_in)
+        return X_in, X_ou
+
+    def on_epoch_end(self):
+        if self.shuffle:
+            self.rng.shuffle(self.indices)
+
+
+def plot_history(history):
+    #Plot training and validation loss (log scale)
+    loss = history.history['loss']
+    val_loss = history.history['val_loss']
+    epochs = range(1, len(loss) + 1)
+
+    plt.plot(epochs, loss, label='Training loss')
+    plt.plot(epochs, val_loss, label='Validation loss')
+    plt.yscale('log')
+    plt.title('Training and validation loss')
+    plt.legend()
+    plt.show()
+
+
+def training_unet(path_save_spectrogram, weights_path, epochs, batch_size,
+                  pretrained=(model_json_path, model_weights_path)):
+    """ This function will read noisy voice and clean voice spectrograms created by data_creation mode,
+    and train a Unet model on this dataset for epochs and batch_size specified. It saves best models to disk regularly.
+    path_save_spectrogram is a sharded dataset (create_data_shards) or the folder of create_data's .npy files.
+    Like the notebook, it fine-tunes the model of pretrained=(json_path, weights_path), Best_json_Unet.json /
+    Best_weight_Unet.h5 by default; pretrained=None trains a new unet() from scratch
+    """
+    dataset = SpectrogramDataset(path_save_spectrogram)
+    train_indices, val_indices = split_indices(len(dataset), test_size=0.10, random_state=42)
+    train_sequence = SpectrogramSequence(dataset, train_indices, batch_size, shuffle=True)
+    val_sequence = SpectrogramSequence(dataset, val_indices, batch_size, shuffle=False)
+
+    #Check shape and distribution on the first batch
+    X_in, X_ou = train_sequence[0]
+    print(f'{len(dataset)} spectrograms, batches of {X_in.shape}')
+    print(f'scaled input in [{X_in.min():.2f}, {X_in.max():.2f}], scaled noise model in [{X_ou.min():.2f}, {X_ou.max():.2f}]')
+
+    if pretrained is None:
+        generator_nn = unet()
+    else:
+        generator_nn = load_model(*pretrained)
+        generator_nn.compile(optimizer='adam', loss='mean_squared_error')
+
+    #Save best models to disk during training
+    checkpoint = ModelCheckpoint(weights_path+'/model_unet_best.h5', verbose=1, monitor='val_loss', save_best_only=True, mode='auto')
+
+    generator_nn.summary()
+
+    #Training
+    history = generator_nn.fit(train_sequence, epochs=epochs, callbacks=[checkpoint], verbose=1, validation_data=val_sequence)
+    model_in_json = generator_nn.to_json()
+
+    #Saving Model
+    with open(weights_path+'model_unet.json', 'w') as json_file:
+        json_file.write(model_in_json)
+
+    plot_history(history)
+
+
+def training_unet_on_the_fly(noise_dir, voice_dir, weights_path, epochs, steps_per_epoch, batch_size,
+                             sample_rate, min_duration, frame_length, hop_length_frame, hop_length_frame_noise,
+                             n_fft, hop_length_fft, validation_steps=10, seed=0, workers=4,
+                             pretrained=(model_json_path, model_weights_path)):
+    """ This function trains the Unet on voices blended with noises while training runs instead of on
+    a fixed set made by create_data: every batch is a new random blend, and memory stays constant.
+    The validation batches are drawn once, with seed + 1, so val_loss is comparable across epochs.
+    pretrained is the model fine-tuned, as in training_unet; None starts from a new unet()
+    """
+    noise = audio_files_to_numpy(noise_dir, sorted(remove_ds_store(os.listdir(noise_dir))), sample_rate,
+                                 frame_length, hop_length_frame_noise, min_duration, copy=False,
+                                 cache_dir=default_cache_dir, workers=None)
+    voice = audio_files_to_numpy(voice_dir, sorted(remove_ds_store(os.listdir(voice_dir))), sample_rate,
+                                 frame_length, hop_length_frame, min_duration, copy=False,
+                                 cache_dir=default_cache_dir, workers=None)
+    print(f'{len(voice)} voice frames, {len(noise)} noise frames')
+
+    validation = list(mixed_batches(voice, noise, batch_size, n_fft, hop_length_fft, seed=seed + 1,
+                                    workers=0, nb_batches=validation_steps))
+    X_val = np.concatenate([X_in for X_in, _ in validation])
+    y_val = np.concatenate([X_ou for _, X_ou in validation])
+    batches = mixed_batches(voice, noise, batch_size, n_fft, hop_length_fft, seed=seed, workers=workers)
+
+    if pretrained is None:
+        generator_nn = unet()
+    else:
+        generator_nn = load_model(*pretrained)
+        generator_nn.compile(optimizer='adam', loss='mean_squared_error')
+
+    #Save best models to disk during training
+    checkpoint = ModelCheckpoint(weights_path+'/model_unet_best.h5', verbose=1, monitor='val_loss', save_best_only=True, mode='auto')
+
+    #Training
+    history = generator_nn.fit(batches, steps_per_epoch=steps_per_epoch, epochs=epochs, callbacks=[checkpoint],
+                               verbose=1, validation_data=(X_val, y_val))
+    model_in_json = generator_nn.to_json()
+
+    #Saving Model
+    with open(weights_path+'model_unet.json', 'w') as json_file:
+        json_file.write(model_in_json)
+
+    plot_history(history)
+
+
+def training_2(path_save_spectrogram, weights_path, epochs, batch_size):
+    """ This function will read noisy voice and clean voice spectrograms created by data_creation mode,
+    and train a Unet model on this dataset for epochs and batch_size specified. It saves best models to disk regularly
+    """
+    import segmentation_models as sm
+    from segmentation_models import Unet
+
+    BACKBONE = 'resnet101'
+    preprocess_input = sm.get_preprocessing(BACKBONE)
+
+    dataset = SpectrogramDataset(path_save_spectrogram)
+    train_indices, val_indices = split_indices(len(dataset), test_size=0.10, random_state=42)
+    # preprocess input, batch by batch
+    train_sequence = SpectrogramSequence(dataset, train_indices, batch_size, shuffle=True, preprocess=preprocess_input)
+    val_sequence = SpectrogramSequence(dataset, val_indices, batch_size, shuffle=False, preprocess=preprocess_input)
+
+    # define number of channels
+    N = 1
+
+    base_model = Unet(backbone_name=BACKBONE, encoder_weights='imagenet')
+
+    inp = Input(shape=(None, None, N))
+    l1 = Conv2D(3, (1, 1))(inp) # map N channels data to 3 channels
+    out = base_model(l1)
+
+    model = Model(inp, out, name=base_model.name)
+
+    # define model
+    model.compile(
+        'Adam',
+        loss=tf.keras.losses.MeanSquaredError(),
+        metrics=['mae']
+    )
+
+    # fitting model
+    checkpoint = ModelCheckpoint(weights_path+'/model_ResNet.h5', verbose=1, monitor='val_loss', save_best_only=True, mode='auto')
+    history = model.fit(
+        train_sequence,
+        epochs=epochs,
+        validation_data=val_sequence,
+        callbacks=[checkpoint]
+    )
+    #Saving model in Json file
+    model_in_json = model.to_json()
+    with open('model_ResNet.json', 'w') as json_file:
+        json_file.write(model_in_json)
+
+    plot_history(history)
@@ -0,0 +1,172 @@
+# Data preparation for U-Net training (Audio_denoising_Training notebook).
+# Clean LibriSpeech voices are blended with ESC-50 noises and saved as spectrograms.
+import os
+from collections import deque
+import multiprocessing
+import numpy as np
+from audio_loader import default_cache_dir
+from denoise import audio_files_to_numpy, numpy_audio_to_matrix_spectrogram, scaled_in, scaled_ou
+from spectrogram_dataset import append_shard, read_index
+
+
+def blend_noise_randomly(voice, noise, nb_samples, frame_length):
+    """This function takes as input numpy arrays representing frames
+    of voice sounds, noise sounds and the number of frames to be created
+    and return numpy arrays with voice randomly blend with noise.
+    voice and noise can also be FrameStack views, only the sampled frames are copied"""
+
+    prod_voice = np.zeros((nb_samples, frame_length))
+    prod_noise = np.zeros((nb_samples, frame_length))
+    prod_noisy_voice = np.zeros((nb_samples, frame_length))
+
+    for i in range(nb_samples):
+        id_voice = np.random.randint(0, voice.shape[0])
+        id_noise = np.random.randint(0, noise.shape[0])
+        level_noise = np.random.uniform(0.2, 0.8)
+        prod_voice[i, :] = voice[id_voice]
+        prod_noise[i, :] = level_noise * noise[id_noise]
+        prod_noisy_voice[i, :] = prod_voice[i, :] + prod_noise[i, :]
+
+    return prod_voice, prod_noise, prod_noisy_voice
+
+
+def remove_ds_store(lst):
+    """remove mac specific file if present"""
+    if '.DS_Store' in lst:
+        lst.remove('.DS_Store')
+
+    return lst
+
+
+#Data Prepare
+def create_data(noise_dir, voice_dir, path_save_spectrogram, sample_rate,
+                min_duration, frame_length, hop_length_frame, hop_length_frame_noise, nb_samples, n_fft, hop_length_fft):
+    """This function will randomly blend some clean voices from voice_dir with some noises from noise_dir
+    and save the spectrograms of noisy voice, noise and clean voices to disk as well as complex phase,
+    time series and sounds. This aims at preparing datasets for denoising training. It takes as inputs
+    parameters defined in args module"""
+
+    list_noise_files = remove_ds_store(os.listdir(noise_dir))
+    list_voice_files = remove_ds_store(os.listdir(voice_dir))
+
+    # Extracting noise and voice from folder as strided views, the overlapping noise
+    # frames (hop_length_frame_noise < frame_length) are not duplicated in memory
+    noise = audio_files_to_numpy(noise_dir, list_noise_files, sample_rate,
+                                 frame_length, hop_length_frame_noise, min_duration, copy=False,
+                                 cache_dir=default_cache_dir, workers=None)
+
+    voice = audio_files_to_numpy(voice_dir, list_voice_files,
+                                 sample_rate, frame_length, hop_length_frame, min_duration, copy=False,
+                                 cache_dir=default_cache_dir, workers=None)
+
+    # Blend some clean voices with random selected noises (and a random level of noise)
+    prod_voice, prod_noise, prod_noisy_voice = blend_noise_randomly(
+        voice, noise, nb_samples, frame_length)
+
+    # Squared spectrogram dimensions
+    dim_square_spec = int(n_fft / 2) + 1
+
+    # Create Amplitude and phase of the sounds
+    m_amp_db_voice, m_pha_voice = numpy_audio_to_matrix_spectrogram(
+        prod_voice, dim_square_spec, n_fft, hop_length_fft)
+    m_amp_db_noise, m_pha_noise = numpy_audio_to_matrix_spectrogram(
+        prod_noise, dim_square_spec, n_fft, hop_length_fft)
+    m_amp_db_noisy_voice, m_pha_noisy_voice = numpy_audio_to_matrix_spectrogram(
+        prod_noisy_voice, dim_square_spec, n_fft, hop_length_fft)
+
+    np.save(path_save_spectrogram + 'voice_amp_db', m_amp_db_voice)
+    np.save(path_save_spectrogram + 'noise_amp_db', m_amp_db_noise)             #Not required
+    np.save(path_save_spectrogram + 'noisy_voice_amp_db', m_amp_db_noisy_voice)
+
+
+def create_data_shards(noise_dir, voice_dir, dataset_dir, sample_rate, min_duration, frame_length,
+                       hop_length_frame, hop_length_frame_noise, nb_shards, samples_per_shard, n_fft,
+                       hop_length_fft, seed=0):
+    """Same as create_data, but the spectrograms are appended to the sharded dataset in dataset_dir
+    (see spectrogram_dataset.py) samples_per_shard at a time. Shards already in the dataset are
+    skipped, so an interrupted run picks up where it stopped and a larger nb_shards grows the dataset.
+    Every shard is blended with its own seed, seed + shard id, so it is the same whenever it is made"""
+
+    done = {shard['id'] for shard in read_index(dataset_dir)}
+    todo = [shard_id for shard_id in range(nb_shards) if shard_id not in done]
+    if not todo:
+        print(f'All {nb_shards} shards are already in {dataset_dir}')
+        return
+
+    list_noise_files = sorted(remove_ds_store(os.listdir(noise_dir)))
+    list_voice_files = sorted(remove_ds_store(os.listdir(voice_dir)))
+
+    noise = audio_files_to_numpy(noise_dir, list_noise_files, sample_rate,
+                                 frame_length, hop_length_frame_noise, min_duration, copy=False,
+                                 cache_dir=default_cache_dir, workers=None)
+    voice = audio_files_to_numpy(voice_dir, list_voice_files,
+                                 sample_rate, frame_length, hop_length_frame, min_duration, copy=False,
+                                 cache_dir=default_cache_dir, workers=None)
+
+    dim_square_spec = int(n_fft / 2) + 1
+
+    for shard_id in todo:
+        np.random.seed(seed + shard_id)
+        prod_voice, _, prod_noisy_voice = blend_noise_randomly(
+            voice, noise, samples_per_shard, frame_length)
+        m_amp_db_voice, _ = numpy_audio_to_matrix_spectrogram(
+            prod_voice, dim_square_spec, n_fft, hop_length_fft, dtype=np.float32)
+        m_amp_db_noisy_voice, _ = numpy_audio_to_matrix_spectrogram(
+            prod_noisy_voice, dim_square_spec, n_fft, hop_length_fft, dtype=np.float32)
+        append_shard(dataset_dir, m_amp_db_noisy_voice, m_amp_db_voice, shard_id=shard_id)
+        print(f'Saved shard {shard_id + 1}/{nb_shards} to {dataset_dir}')
+
+
+def mix_batch(voice_frames, noise_frames, levels, n_fft, hop_length_fft):
+    """This function blends voice frames with noise frames at the given levels and returns the
+    network input and target of training_unet: scaled noisy voice and scaled noise model,
+    both of size (nb_frame,dim_square_spec,dim_square_spec,1) in float32"""
+    dim_square_spec = int(n_fft / 2) + 1
+    noisy_voice = voice_frames + levels[:, np.newaxis] * noise_frames
+
+    m_amp_db_voice, _ = numpy_audio_to_matrix_spectrogram(
+        voice_frames, dim_square_spec, n_fft, hop_length_fft, dtype=np.float32)
+    m_amp_db_noisy_voice, _ = numpy_audio_to_matrix_spectrogram(
+        noisy_voice, dim_square_spec, n_fft, hop_length_fft, dtype=np.float32)
+
+    X_in = scaled_in(m_amp_db_noisy_voice)[..., np.newaxis]
+    X_ou = scaled_ou(m_amp_db_noisy_voice - m_amp_db_voice)[..., np.newaxis]
+    return X_in, X_ou
+
+
+def mixed_batches(voice, noise, batch_size, n_fft, hop_length_fft, seed=0, workers=4, prefetch=8,
+                  nb_batches=None):
+    """Infinite generator of (X_in, X_ou) training batches blended on the fly, with the same
+    random levels as blend_noise_randomly. voice and noise are frame matrices or FrameStack.
+    The frames and levels are drawn here from a generator seeded with seed, so the batches only
+    depend on the seed; the spectrograms are computed by `workers` processes, at most
+    `prefetch` batches ahead. nb_batches stops the generator after that many batches"""
+
+    rng = np.random.default_rng(seed)
+
+    def draw():
+        id_voice = np.sort(rng.integers(0, voice.shape[0], batch_size))
+        id_noise = np.sort(rng.integers(0, noise.shape[0], batch_size))
+        levels = rng.uniform(0.2, 0.8, batch_size)
+        # sorted ids keep the reads of memory-mapped or strided frames in order, pair them again at random
+        rng.shuffle(id_noise)
+        return voice[id_voice], noise[id_noise], levels, n_fft, hop_length_fft
+
+    if workers == 0:
+        count = 0
+        while nb_batches is None or count < nb_batches:
+            yield mix_batch(*draw())
+            count += 1
+        return
+
+    # spawn, not fork: the training process has tensorflow loaded and running threads
+    with multiprocessing.get_context('spawn').Pool(processes=workers) as pool:
+        pending = deque()
+        submitted = 0
+        while True:
+            while len(pending) < prefetch and (nb_batches is None or submitted < nb_batches):
+                pending.append(pool.apply_async(mix_batch, draw()))
+                submitted += 1
+            if not pending:
+                return
+            yield pending.popleft().get()
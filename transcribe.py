@@ -1,8 +1,41 @@
+import torch
 import whisper_at as whisper
-from jiwer import wer
+from jiwer.transformations import wer_default
 import argparse
+import csv
 import os
 import string
+import sys
+from multiprocessing.connection import AuthenticationError, Client, Listener
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarking_script'))
+from wer_scoring import Reference
+
+'''
+Word Accuracy Rate (WAR) of Whisper transcriptions.
+
+One file:
+  python transcribe.py reference.txt audio.wav
+A whole folder, the model is loaded once. Each .wav is scored against <prefix>.txt where prefix is
+the part of its name before the first '_' (same pairing as tabulate_audiofiles.py):
+  python transcribe.py --dir test/ --txt-dir txts/ -o war.csv
+A manifest, a .csv with reference_file,audio_file columns:
+  python transcribe.py --manifest pairs.csv -o war.csv
+Every file goes through model.transcribe, as calculate_war always did. --batch-size 8 decodes the
+files of up to 30 s 8 at a time with one greedy whisper.decode call instead: faster, but without
+the temperature fallback and prompt of model.transcribe, so transcripts and W.A.R. can differ.
+Persistent worker, keeps the weights loaded between scoring runs. Requests are pickled, so the
+worker only listens on 127.0.0.1 unless a host is given, and needs a secret shared with its
+clients (--authkey or the TRANSCRIBE_AUTHKEY environment variable):
+  export TRANSCRIBE_AUTHKEY=<secret>
+  python transcribe.py --serve 6000 &
+  python transcribe.py --server 6000 --dir test/ --txt-dir txts/ -o war.csv
+'''
+
+default_model = "small.en"
+default_host = '127.0.0.1'
+authkey_variable = 'TRANSCRIBE_AUTHKEY'
+_models = {}
+
 
 # Function to preprocess text: remove punctuation and convert to lowercase
 def preprocess_text(text):
@@ -10,50 +43,206 @@ def preprocess_text(text):
     text = text.translate(str.maketrans('', '', string.punctuation))  # Remove punctuation
     return text
 
-# Function to calculate Word Accuracy Rate (WAR)
-def calculate_war(reference_file, audio_file):
-    # Load the Whisper model
-    # model = whisper.load_model("large-v1")
-    model = whisper.load_model("small.en")
 
-    # Transcribe the audio file
+def load_whisper(model_name=default_model):
+    """Returns the Whisper model, loading it only the first time"""
+    if model_name not in _models:
+        _models[model_name] = whisper.load_model(model_name)
+    return _models[model_name]
+
+
+def transcribe_file(model, audio_file):
+    """Transcription of one file by model.transcribe, as calculate_war always did"""
     audio_tagging_time_resolution = 10
-    result = model.transcribe(audio_file, at_time_res=audio_tagging_time_resolution)
+    return model.transcribe(audio_file, at_time_res=audio_tagging_time_resolution)["text"]
+
+
+def transcribe_many(model, audio_files, batch_size=1):
+    """This function returns the transcription of every audio file, in order.
+    With batch_size=1 every file goes through transcribe_file. With batch_size > 1 the files that
+    fit in one 30 s Whisper window are decoded batch_size at a time by a greedy whisper.decode,
+    which can give other transcripts than model.transcribe; longer files still go through
+    transcribe_file. Audio is loaded one batch at a time"""
+    if batch_size <= 1:
+        return [transcribe_file(model, audio_file) for audio_file in audio_files]
 
-    # Get the transcribed text
-    transcribed_text = result["text"]
-    print("ASR Results:", transcribed_text)
+    texts = [None] * len(audio_files)
+    options = whisper.DecodingOptions(language='en', fp16=False)
+    for start in range(0, len(audio_files), batch_size):
+        batch = []
+        for i in range(start, min(start + batch_size, len(audio_files))):
+            audio = whisper.load_audio(audio_files[i])
+            if len(audio) <= whisper.audio.N_SAMPLES:
+                batch.append((i, audio))
+            else:
+                texts[i] = transcribe_file(model, audio_files[i])
+        if not batch:
+            continue
+        # make log-Mel spectrograms and move them to the same device as the model
+        mels = [whisper.log_mel_spectrogram(whisper.pad_or_trim(audio)) for _, audio in batch]
+        results = whisper.decode(model, torch.stack(mels).to(model.device), options)
+        for (i, _), result in zip(batch, results):
+            texts[i] = result.text
+    return texts
 
+
+def read_reference(reference_file):
     # Load the reference transcription from the text file
     with open(reference_file, 'r') as file:
-        reference_text = file.read().strip()
+        return file.read().strip()
+
+
+def score_many(pairs, model=None, batch_size=1):
+    """This function takes (reference_file, audio_file) pairs and returns one row per pair with
+    the transcription and the WAR. Each reference file is only read once"""
+    model = model or load_whisper()
+    texts = transcribe_many(model, [audio_file for _, audio_file in pairs], batch_size)
+    # each reference is read, preprocessed and split into words once, whatever its number of files
+    references = {reference_file: Reference(preprocess_text(read_reference(reference_file)), wer_default)
+                  for reference_file in {ref for ref, _ in pairs}}
+    return [{'reference_file': reference_file, 'audio_file': audio_file, 'transcript': text,
+             'war': (1 - references[reference_file].score(preprocess_text(text)).wer) * 100}
+            for (reference_file, audio_file), text in zip(pairs, texts)]
+
+
+# Function to calculate Word Accuracy Rate (WAR)
+def calculate_war(reference_file, audio_file, model=None):
+    # The Whisper model is loaded once per process and reused by later calls
+    row = score_many([(reference_file, audio_file)], model=model)[0]
+    print("ASR Results:", row['transcript'])
+    return row['war']
+
+
+def pairs_from_dir(audio_dir, txt_dir):
+    """Pairs every .wav of audio_dir with the .txt of txt_dir named after its prefix"""
+    pairs = []
+    for wav_name in sorted(os.listdir(audio_dir)):
+        if not wav_name.endswith('.wav'):
+            continue
+        reference_file = os.path.join(txt_dir, f"{wav_name.split('_')[0]}.txt")
+        if os.path.exists(reference_file):
+            pairs.append((reference_file, os.path.join(audio_dir, wav_name)))
+        else:
+            print(f"No reference for {wav_name}, skipping")
+    return pairs
+
 
-    # Preprocess both texts
-    transcribed_text = preprocess_text(transcribed_text)
-    reference_text = preprocess_text(reference_text)
+def pairs_from_manifest(manifest_file):
+    with open(manifest_file, newline='') as file:
+        return [(row['reference_file'], row['audio_file']) for row in csv.DictReader(file)]
 
-    # Calculate the Word Error Rate (WER)
-    error_rate = wer(reference_text, transcribed_text)
 
-    # Calculate Word Accuracy Rate (WAR)
-    war = (1 - error_rate) * 100
-    return war
+def write_rows(rows, output_file):
+    with open(output_file, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=['reference_file', 'audio_file', 'transcript', 'war'])
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def parse_address(address):
+    """[HOST:]PORT, the host is 127.0.0.1 when it is not given"""
+    host, _, port = address.rpartition(':')
+    return host or default_host, int(port)
+
+
+def get_authkey(authkey=None):
+    """The shared secret of the worker and its clients: authkey, else the TRANSCRIBE_AUTHKEY variable,
+    None if neither is set. There is no default, a known key would let anyone who reaches the port
+    send pickles"""
+    authkey = authkey or os.environ.get(authkey_variable)
+    if not authkey:
+        return None
+    return authkey.encode('utf-8') if isinstance(authkey, str) else authkey
+
+
+def serve(address, authkey, model_name=default_model, batch_size=1):
+    """Persistent worker: loads the model once, then scores the list of pairs sent by each client.
+    A client that fails authentication, disconnects or sends a bad request does not stop the worker"""
+    model = load_whisper(model_name)
+    with Listener(address, authkey=authkey) as listener:
+        print(f"Scoring worker ready on {address[0]}:{address[1]}")
+        while True:
+            try:
+                connection = listener.accept()
+            except (AuthenticationError, OSError, EOFError) as e:
+                print(f"Rejected a client: {e!r}")
+                continue
+            with connection:
+                try:
+                    pairs = connection.recv()
+                    connection.send(score_many(pairs, model, batch_size))
+                except (OSError, EOFError) as e:
+                    print(f"Client disconnected: {e!r}")
+                except Exception as e:
+                    try:
+                        connection.send(e)
+                    except (OSError, EOFError):
+                        print(f"Client disconnected: {e!r}")
+
+
+def score_remote(pairs, address, authkey):
+    """Sends pairs to a worker started with --serve and returns its rows"""
+    with Client(address, authkey=authkey) as connection:
+        connection.send(pairs)
+        rows = connection.recv()
+    if isinstance(rows, Exception):
+        raise rows
+    return rows
+
 
 def main():
     # Parse command-line arguments
     parser = argparse.ArgumentParser(description="Calculate Word Accuracy Rate (WAR) using Whisper model.")
-    parser.add_argument('reference_file', type=str, help='Path to the reference transcription text file')
-    parser.add_argument('audio_file', type=str, help='Path to the audio file to be transcribed')
-    
+    parser.add_argument('reference_file', type=str, nargs='?', help='Path to the reference transcription text file')
+    parser.add_argument('audio_file', type=str, nargs='?', help='Path to the audio file to be transcribed')
+    parser.add_argument('--dir', dest='audio_dir', type=str, help='Score every .wav of this directory')
+    parser.add_argument('--txt-dir', dest='txt_dir', type=str, help='Directory of the reference .txt files for --dir')
+    parser.add_argument('--manifest', type=str, help='.csv with reference_file,audio_file columns')
+    parser.add_argument('-o', dest='output_file', type=str, default='war.csv', help='Where to write the WAR of each file')
+    parser.add_argument('--model', type=str, default=default_model, help='Whisper model name')
+    parser.add_argument('--batch-size', dest='batch_size', type=int, default=1,
+                        help='Files of up to 30 s decoded together by greedy decoding, 1 to use model.transcribe for every file')
+    parser.add_argument('--serve', type=str, metavar='[HOST:]PORT', help='Run as a persistent scoring worker, on 127.0.0.1 by default')
+    parser.add_argument('--server', type=str, metavar='[HOST:]PORT', help='Send the files to a persistent worker')
+    parser.add_argument('--authkey', type=str, help=f'Secret shared by the worker and its clients, defaults to ${authkey_variable}')
+
     args = parser.parse_args()
-    
-    # Ensure files exist
-    if os.path.exists(args.reference_file) and os.path.exists(args.audio_file):
-        # Calculate WAR
-        war = calculate_war(args.reference_file, args.audio_file)
-        print(f"Word Accuracy Rate: {war:.2f}%")
+
+    authkey = get_authkey(args.authkey)
+    if (args.serve or args.server) and authkey is None:
+        parser.error(f'--serve and --server need a secret: --authkey or the {authkey_variable} environment variable')
+
+    if args.serve:
+        serve(parse_address(args.serve), authkey, args.model, args.batch_size)
+        return
+
+    if args.audio_dir:
+        pairs = pairs_from_dir(args.audio_dir, args.txt_dir or args.audio_dir)
+    elif args.manifest:
+        pairs = pairs_from_manifest(args.manifest)
+    elif args.reference_file and args.audio_file:
+        # Ensure files exist
+        if not (os.path.exists(args.reference_file) and os.path.exists(args.audio_file)):
+            print("Reference file or audio file not found.")
+            return
+        pairs = [(args.reference_file, args.audio_file)]
     else:
-        print("Reference file or audio file not found.")
+        parser.error('give reference_file and audio_file, --dir or --manifest')
+
+    if args.server:
+        rows = score_remote(pairs, parse_address(args.server), authkey)
+    else:
+        rows = score_many(pairs, load_whisper(args.model), args.batch_size)
+
+    if len(rows) == 1 and not (args.audio_dir or args.manifest):
+        print("ASR Results:", rows[0]['transcript'])
+        print(f"Word Accuracy Rate: {rows[0]['war']:.2f}%")
+        return
+    for row in rows:
+        print(f"{os.path.basename(row['audio_file'])}: {row['war']:.2f}%")
+    write_rows(rows, args.output_file)
+    print(f"Saved WAR of {len(rows)} files to {args.output_file}")
+
 
 if __name__ == "__main__":
     main()